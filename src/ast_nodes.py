@@ -3,9 +3,28 @@ Abstract Syntax Tree Node Definitions
 Updated to support robust data cleaning and NaN handling.
 """
 
+def _freeze(value):
+    """Convert node fields into hashable, order-preserving tuples"""
+    if isinstance(value, ASTNode):
+        return value._key()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    return value
+
 class ASTNode:
     """Base class for all AST nodes"""
-    pass
+    
+    def _key(self):
+        """Structural identity: the node type plus its fields, recursively"""
+        return (type(self).__name__, tuple(sorted((k, _freeze(v)) for k, v in vars(self).items())))
+    
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+    
+    def __hash__(self):
+        return hash(self._key())
 
 class Program(ASTNode):
     """Root node containing the sequence of DTL commands"""
@@ -93,10 +112,10 @@ class RenameNode(ASTNode):
 class SelectNode(ASTNode):
     """Represents: select <col1>, <col2>..."""
     def __init__(self, columns):
-        self.columns = columns  # A list of strings
+        self.columns = tuple(columns)  # Column names; read-only once parsed
     
     def __repr__(self):
-        return f"SelectNode(columns={self.columns})"
+        return f"SelectNode(columns={list(self.columns)})"
 
 class SortNode(ASTNode):
     """Represents: sort by <column> [asc|desc]"""
@@ -116,4 +135,67 @@ class GroupByNode(ASTNode):
     
     def __repr__(self):
         return (f"GroupByNode(by={self.column}, "
-                f"target={self.aggregate_col}, func={self.aggregate_func})")
\ No newline at end of file
+                f"target={self.aggregate_col}, func={self.aggregate_func})")
+
+# --- Optimizer Nodes (built by the code generator, never by the parser) ---
+
+class CleanBlockNode(ASTNode):
+    """A run of consecutive trim/clean/fillna/rename commands emitted as one fused pass"""
+    def __init__(self, commands, trim=False, fillna=None, fill=None,
+                 drop_na=False, dedupe=False, rename=None):
+        self.commands = commands          # The original nodes, kept for comments
+        self.trim = trim
+        self.fillna = fillna or {}        # column -> fill literal (Python source)
+        self.fill = fill                  # 'ffill', 'bfill' or None
+        self.drop_na = drop_na
+        self.dedupe = dedupe
+        self.rename = rename or {}        # old name -> new name
+    
+    def __repr__(self):
+        return f"CleanBlockNode(commands={len(self.commands)})"
+
+class FilterGroupNode(ASTNode):
+    """A run of consecutive filters applied through one combined boolean mask"""
+    def __init__(self, filters):
+        self.filters = filters            # The original FilterNodes, in source order
+    
+    def __repr__(self):
+        return f"FilterGroupNode(filters={len(self.filters)})"
+
+class RenameGroupNode(ASTNode):
+    """Consecutive renames applied as one mapping, optionally followed by a select"""
+    def __init__(self, mapping, select=None):
+        self.mapping = mapping            # old name -> new name
+        self.select = select              # Columns of a select folded into the rename, or None
+    
+    def __repr__(self):
+        return f"RenameGroupNode(mapping={self.mapping}, select={self.select})"
+
+# --- Plain-data form, used by the CLI's on-disk AST cache ---
+
+def ast_to_data(value):
+    """Convert an AST into JSON-compatible lists and dicts"""
+    if isinstance(value, ASTNode):
+        return {'node': type(value).__name__, 'fields': {k: ast_to_data(v) for k, v in vars(value).items()}}
+    if isinstance(value, tuple):
+        return {'tuple': [ast_to_data(v) for v in value]}
+    if isinstance(value, list):
+        return [ast_to_data(v) for v in value]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError(f"Cannot store {type(value).__name__} in AST data")
+
+def ast_from_data(data):
+    """Rebuild an AST from ast_to_data's output; only node classes defined here are created"""
+    if isinstance(data, list):
+        return [ast_from_data(v) for v in data]
+    if isinstance(data, dict):
+        if 'tuple' in data:
+            return tuple(ast_from_data(v) for v in data['tuple'])
+        cls = globals().get(data['node'])
+        if not (isinstance(cls, type) and issubclass(cls, ASTNode)):
+            raise ValueError(f"Unknown AST node type: {data['node']!r}")
+        node = cls.__new__(cls)
+        node.__dict__.update({k: ast_from_data(v) for k, v in data['fields'].items()})
+        return node
+    return data
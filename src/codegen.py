@@ -5,41 +5,203 @@ COMPLETELY FIXED:
 - Updated pandas 2.0+ syntax
 """
 
+import io
 import os
+from functools import lru_cache
+from pathlib import Path
 from ast_nodes import *
 
+# Generated code keyed by the AST's structural key, so recompiling the same
+# program (web UI reruns, batch builds) skips generation entirely
+_CODE_CACHE = {}
+_CODE_CACHE_SIZE = 256
+
+# Auto-streaming (stream=None, opt-in): inputs at least this large are read in
+# chunks when the pipeline allows it
+STREAM_MIN_BYTES = 1 << 30
+STREAM_CHUNK_ROWS = 1_000_000
+
+# Emitted once at the top of programs that contain a fused cleaning block.
+# Row removal (dropna + drop_duplicates) is combined into one boolean mask so the
+# frame is filtered exactly once, and trimming runs on the surviving rows only
+# when nothing else in the block depends on trimmed values.
+FUSED_CLEAN_HELPER = """\
+def _fused_clean(df, trim=False, fillna=None, fill=None, drop_na=False, dedupe=False, rename=None, out=None):
+    def _strip(frame):
+        str_cols = frame.select_dtypes(include=['object', 'string']).columns
+        return frame.assign(**{c: frame[c].str.strip() for c in str_cols})
+    
+    # Duplicate detection and fill values must see trimmed strings
+    trim_first = trim and (dedupe or bool(fillna))
+    if trim_first:
+        df = _strip(df)
+    for col, value in (fillna or {}).items():
+        if col in df.columns:
+            df[col] = df[col].fillna(value)
+        else:
+            print(f"Warning: Column '{col}' not found in dataframe", file=out)
+    if fill == 'ffill':
+        df = df.ffill()
+    elif fill == 'bfill':
+        df = df.bfill()
+    if drop_na or dedupe:
+        keep = np.ones(len(df), dtype=bool)
+        if drop_na:
+            keep &= df.notna().all(axis=1).values
+        if dedupe:
+            keep &= ~df.duplicated(keep='first').values
+        df = df.loc[keep]
+    if trim and not trim_first:
+        df = _strip(df)
+    if rename:
+        for old in rename:
+            if old not in df.columns:
+                print(f"Warning: Column '{old}' not found", file=out)
+        df = df.rename(columns=rename)
+    return df
+"""
+
+# Emitted at the top of streamed programs. An input without data rows may give no
+# chunks at all, so an empty frame carrying the header stands in for them and every
+# save still writes its file.
+STREAM_HELPER = """\
+def _chunks(path, chunksize, **kwargs):
+    empty = True
+    for chunk in pd.read_csv(path, chunksize=chunksize, **kwargs):
+        empty = False
+        yield chunk
+    if empty:
+        yield pd.read_csv(path, nrows=0, **kwargs)
+"""
+
+# Emitted in place of a plain import for programs that group. The generated script
+# must run wherever it is copied, so it never names the compiler's directory: when
+# dtl_runtime is importable (the web app, or src on PYTHONPATH) the compiled kernels
+# are used, and otherwise the same pandas expression they stand in for.
+GROUPBY_IMPORT = """\
+try:
+    from dtl_runtime import fast_groupby
+except ImportError:
+    def fast_groupby(df, by, value, func):
+        return getattr(df.groupby(by)[value], func)().reset_index()
+"""
+
 class CodeGenerator:
     """Generates Python code from the AST"""
     
-    def __init__(self, ast):
+    def __init__(self, ast, use_arrow=False, stream=False):
         self.ast = ast
-        self.code_lines = []
+        # Arrow loading is opt-in: the C engine pads short rows and skips long ones,
+        # while pyarrow can only skip (or reject) every malformed row
+        self.use_arrow = bool(use_arrow)
+        self.stream = stream  # True = always, None = only inputs of STREAM_MIN_BYTES or more
         self.imports_added = set()
         self.df_var = 'df'
-        self.skip_rows = 0  # Track skip rows for load command
+        
+        # Node type -> emitter, built once instead of an isinstance ladder per command
+        self._dispatch = {
+            LoadNode: self._gen_load,
+            SaveNode: self._gen_save,
+            FilterNode: self._gen_filter,
+            SelectNode: self._gen_select,
+            SortNode: self._gen_sort,
+            GroupByNode: self._gen_group_by,
+            CleanNode: self._gen_clean,
+            TrimNode: self._gen_trim,
+            RenameNode: self._gen_rename,
+            SkipNode: self._gen_skip,
+            CleanBlockNode: self._gen_clean_block,
+            FilterGroupNode: self._gen_filter_group,
+            RenameGroupNode: self._gen_rename_group,
+        }
     
     def generate(self):
         """Generate complete Python code from AST"""
-        self._add_imports()
+        streaming = self._use_streaming()
+        key = (self.ast._key(), self.use_arrow, streaming)
+        cached = _CODE_CACHE.get(key)
+        if cached is not None:
+            return cached
+        
+        # Per-generation state starts fresh, so calling generate() again (save_to_file
+        # after an evicted cache entry) emits the same program instead of appending
+        self._buf = io.StringIO()
+        self.skip_rows = 0  # Track skip rows for load command
+        self.usecols = None  # Source columns to load (None = all)
+        self.sorted = False  # Set once a sort has been emitted
+        w = self._buf.write
+        self._add_imports(w)
         self._preprocess_skip()  # Find skip commands before generating
-        self._generate_commands()
-        return '\n'.join(self.code_lines)
+        self.usecols = self._collect_referenced_columns()
+        plan = self._optimize_plan(self.ast.commands)
+        self.commands = self._fuse_adjacent(self._fuse_cleaning_block(plan))
+        if any(isinstance(c, CleanBlockNode) for c in self.commands):
+            w(FUSED_CLEAN_HELPER)
+            w("\n")
+        if streaming:
+            w(STREAM_HELPER)
+            w("\n")
+        body = io.StringIO()
+        if streaming:
+            self._generate_stream(body.write)
+        else:
+            self._generate_commands(body.write)
+        self._emit_run(w, body.getvalue(), streaming)
+        code = self._buf.getvalue()
+        
+        if len(_CODE_CACHE) >= _CODE_CACHE_SIZE:
+            _CODE_CACHE.pop(next(iter(_CODE_CACHE)))  # Evict the oldest entry
+        _CODE_CACHE[key] = code
+        return code
     
     def save_to_file(self, filename):
         """Generate code and save to file"""
+        path = Path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
         code = self.generate()
-        os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
-        with open(filename, 'w') as f:
-            f.write(code)
+        path.write_text(code)
         return code
     
-    def _add_imports(self):
+    def _add_imports(self, w):
         """Add necessary imports"""
-        self.code_lines.append("import pandas as pd")
-        self.code_lines.append("import numpy as np")
-        self.code_lines.append("import warnings")
-        self.code_lines.append("warnings.filterwarnings('ignore')")
-        self.code_lines.append("")
+        w("import pandas as pd\n")
+        w("import numpy as np\n")
+        w("import warnings\n")
+        if any(isinstance(c, GroupByNode) for c in self.ast.commands):
+            w(GROUPBY_IMPORT)
+        w("\n")
+    
+    def _use_streaming(self):
+        """Decide whether to emit the chunked pipeline instead of a single full load"""
+        if self.stream is False or not self._streamable():
+            return False
+        if self.stream:
+            return True
+        filename = self._clean_string(self.ast.commands[0].filename)
+        try:
+            return os.path.getsize(filename) >= STREAM_MIN_BYTES
+        except OSError:
+            return False
+    
+    def _streamable(self):
+        """
+        True when every command works row by row, so the program can run one chunk
+        at a time: a single leading load, at least one save and nothing that needs
+        the whole frame (sort, group by, drop_duplicates, ffill/bfill).
+        """
+        commands = self.ast.commands
+        if not commands or not isinstance(commands[0], LoadNode):
+            return False
+        if not any(isinstance(c, SaveNode) for c in commands):
+            return False
+        for command in commands[1:]:
+            if isinstance(command, CleanNode):
+                if command.clean_type == 'duplicates' or (
+                        command.clean_type == 'missing' and command.strategy != 'drop'):
+                    return False
+            elif not isinstance(command, (SkipNode, FilterNode, SelectNode, TrimNode, RenameNode, SaveNode)):
+                return False
+        return True
     
     def _preprocess_skip(self):
         """Find skip command that comes right after load"""
@@ -50,98 +212,406 @@ class CodeGenerator:
                     self.skip_rows = self.ast.commands[i + 1].num_rows
                 break
     
-    def _generate_commands(self):
-        """Generate code for each command in the AST"""
-        for i, command in enumerate(self.ast.commands):
-            if isinstance(command, LoadNode):
-                self._gen_load(command)
-            elif isinstance(command, SkipNode):
-                # Skip is handled in load command, just add a comment
-                self.code_lines.append(f"# Skip handled in load (skiprows={self.skip_rows})")
-                self.code_lines.append("")
-            elif isinstance(command, SaveNode):
-                self._gen_save(command)
+    def _collect_referenced_columns(self):
+        """
+        Scan the pipeline once and work out the usecols hint for the load command:
+        the source columns the program touches, or None when every column must be kept.
+        No dtype hints are derived. A filter against a quoted literal says nothing about
+        the column's type, and forcing it to str would change comparisons, sorts and
+        aggregations on columns pandas would have read as numbers.
+        """
+        commands = self.ast.commands
+        if sum(isinstance(c, LoadNode) for c in commands) != 1:
+            return None
+        
+        referenced = []
+        aliases = {}  # current column name -> column name in the CSV header
+        projected = False
+        
+        def ref(col):
+            source = aliases.get(col, col)
+            if source not in referenced:
+                referenced.append(source)
+            return source
+        
+        for command in commands:
+            if isinstance(command, SelectNode):
+                for col in command.columns:
+                    ref(self._clean_string(col))
+                projected = True
             elif isinstance(command, FilterNode):
-                self._gen_filter(command)
-            elif isinstance(command, SelectNode):
-                self._gen_select(command)
+                ref(self._clean_string(command.column))
             elif isinstance(command, SortNode):
-                self._gen_sort(command)
+                ref(self._clean_string(command.column))
+            elif isinstance(command, RenameNode):
+                old_name = self._clean_string(command.old_name)
+                aliases[self._clean_string(command.new_name)] = ref(old_name)
+            elif isinstance(command, CleanNode) and command.clean_type == 'fillna':
+                ref(self._clean_string(command.column))
             elif isinstance(command, GroupByNode):
-                self._gen_group_by(command)
-            elif isinstance(command, CleanNode):
-                self._gen_clean(command)
-            elif isinstance(command, TrimNode):
-                self._gen_trim(command)
+                ref(self._clean_string(command.column))
+                ref(self._clean_string(command.aggregate_col))
+                # Everything after a group by works on the aggregated frame
+                projected = True
+                break
+            elif not projected and (isinstance(command, SaveNode) or (
+                    isinstance(command, CleanNode) and command.clean_type in ('missing', 'duplicates')
+                    and command.strategy == 'drop')):
+                # Whole-row operations before any projection need every column
+                return None
+        
+        return referenced if projected else None
+    
+    def _optimize_plan(self, commands):
+        """
+        Projection push-down: move each select up past the commands it commutes with,
+        so they run on fewer columns. The moved select also keeps the columns those
+        commands use; if that adds any, the original select stays in place to drop them.
+        """
+        plan = []
+        for command in commands:
+            if isinstance(command, SelectNode):
+                selected = [self._clean_string(col) for col in command.columns]
+                target = len(plan)
+                while target and self._commutes_with_select(plan[target - 1], selected):
+                    target -= 1
+                if target < len(plan):
+                    columns = list(selected)
+                    for moved in plan[target:]:
+                        col = self._select_dependency(moved)
+                        if col is not None and col not in columns:
+                            columns.append(col)
+                    plan.insert(target, SelectNode(columns))
+                    if len(columns) > len(selected):
+                        plan.append(command)
+                    continue
+            plan.append(command)
+        return plan
+    
+    def _commutes_with_select(self, command, selected):
+        """
+        True if a select can run before the command without changing the result.
+        Row-wide operations (dropna, drop_duplicates) look at every column, and renames
+        would need the select rewritten, so a select never moves past them.
+        """
+        if isinstance(command, (FilterNode, SortNode, TrimNode)):
+            return True
+        if isinstance(command, CleanNode):
+            if command.clean_type == 'fillna':
+                # fillna tolerates a missing column but a select doesn't, so only move
+                # past fillna on columns the select keeps anyway
+                return self._clean_string(command.column) in selected
+            return command.clean_type == 'missing' and command.strategy in ('ffill', 'bfill')
+        return False
+    
+    def _select_dependency(self, command):
+        """Column a command needs to be present, if any"""
+        if isinstance(command, (FilterNode, SortNode)) or (
+                isinstance(command, CleanNode) and command.clean_type == 'fillna'):
+            return self._clean_string(command.column)
+        return None
+    
+    def _clean_stage(self, command):
+        """
+        Position of a command inside a fused cleaning block, or None if it can't be fused.
+        A block applies its stages in this order, so a run is only fused while stages
+        never go backwards.
+        """
+        if isinstance(command, TrimNode):
+            return 0
+        if isinstance(command, CleanNode):
+            if command.clean_type == 'fillna':
+                # fillna <col> nan overwrites the column rather than filling it
+                return None if command.value == 'np.nan' else 1
+            if command.clean_type == 'missing' and command.strategy in ('ffill', 'bfill'):
+                return 2
+            return 3  # dropna / drop_duplicates commute with each other
+        if isinstance(command, RenameNode):
+            return 4
+        return None
+    
+    def _fuse_cleaning_block(self, commands):
+        """Collapse runs of trim/clean/fillna/rename commands into CleanBlockNodes"""
+        plan = []
+        run = []
+        
+        def flush():
+            if len(run) > 1 and all(isinstance(c, RenameNode) for c in run):
+                # Pure renames don't need the cleaning helper, just one rename call
+                plan.append(RenameGroupNode({self._clean_string(c.old_name): self._clean_string(c.new_name)
+                                             for c in run}))
+            elif len(run) > 1:
+                plan.append(self._build_clean_block(run))
+            else:
+                plan.extend(run)
+            run.clear()
+        
+        stage = None
+        for command in commands:
+            command_stage = self._clean_stage(command)
+            if command_stage is None:
+                flush()
+                plan.append(command)
+                continue
+            if run and (command_stage < stage or not self._fits_clean_block(run, command)):
+                flush()
+            run.append(command)
+            stage = command_stage
+        flush()
+        return plan
+    
+    def _fits_clean_block(self, run, command):
+        """Reject commands whose effect would change if applied together with the run"""
+        if isinstance(command, CleanNode) and command.strategy in ('ffill', 'bfill'):
+            # Only one fill direction per block; ffill then bfill isn't bfill then ffill
+            return all(not (isinstance(c, CleanNode) and c.strategy in ('ffill', 'bfill')
+                            and c.strategy != command.strategy) for c in run)
+        if isinstance(command, RenameNode):
+            # A single rename dict maps names simultaneously, so chains can't be merged
+            old_name = self._clean_string(command.old_name)
+            for c in run:
+                if isinstance(c, RenameNode) and old_name in (self._clean_string(c.old_name),
+                                                              self._clean_string(c.new_name)):
+                    return False
+        return True
+    
+    def _build_clean_block(self, run):
+        """Translate a run of cleaning commands into the arguments of _fused_clean"""
+        block = CleanBlockNode(list(run))
+        for command in run:
+            if isinstance(command, TrimNode):
+                block.trim = True
             elif isinstance(command, RenameNode):
-                self._gen_rename(command)
+                block.rename[self._clean_string(command.old_name)] = self._clean_string(command.new_name)
+            elif command.clean_type == 'fillna':
+                # Only the first fillna on a column can have an effect
+                block.fillna.setdefault(self._clean_string(command.column), self._fill_literal(command.value))
+            elif command.clean_type == 'duplicates':
+                block.dedupe = True
+            elif command.strategy == 'drop':
+                block.drop_na = True
+            else:
+                block.fill = command.strategy
+        return block
+    
+    def _fuse_adjacent(self, commands):
+        """
+        Collapse runs of consecutive filters into FilterGroupNodes, and fold a select
+        that directly follows a rename into the rename's single call.
+        """
+        plan = []
+        for command in commands:
+            previous = plan[-1] if plan else None
+            if isinstance(command, FilterNode) and isinstance(previous, (FilterNode, FilterGroupNode)):
+                filters = previous.filters if isinstance(previous, FilterGroupNode) else [previous]
+                plan[-1] = FilterGroupNode(filters + [command])
+            elif isinstance(command, SelectNode) and isinstance(previous, RenameNode):
+                mapping = {self._clean_string(previous.old_name): self._clean_string(previous.new_name)}
+                plan[-1] = RenameGroupNode(mapping, command.columns)
+            elif (isinstance(command, SelectNode) and isinstance(previous, RenameGroupNode)
+                  and previous.select is None):
+                plan[-1] = RenameGroupNode(previous.mapping, command.columns)
+            else:
+                plan.append(command)
+        return plan
+    
+    def _emit_run(self, w, body, streaming=False):
+        """
+        Wrap the generated statements in run(), which returns the final DataFrame, so
+        the program can be imported and called in-process as well as run as a script.
+        A streamed program never holds the whole result, only its last chunk, so its
+        run() is write-only and returns None rather than a misleading partial frame.
+        Progress messages go to run()'s out stream (None = stdout), so a caller can
+        capture them without swapping sys.stdout for the whole process.
+        """
+        w("def run(out=None):\n")
+        if streaming:
+            w('    """Execute the DTL program chunk by chunk; results go only to the saved files.\n')
+        else:
+            w('    """Execute the DTL program and return the resulting DataFrame.\n')
+        w('    Progress messages are printed to out, or to stdout when it is None."""\n')
+        # Warnings are silenced for this call only, so a process that imports and
+        # runs the program keeps its own warning filters
+        w("    with warnings.catch_warnings():\n")
+        w("        warnings.simplefilter('ignore')\n")
+        for line in body.splitlines():
+            w(f"        {line}\n" if line else "\n")
+        w(f"        return None\n" if streaming else f"        return {self.df_var}\n")
+        w("\n\n")
+        w("if __name__ == '__main__':\n")
+        w("    run()\n")
+    
+    def _generate_commands(self, w):
+        """Generate code for each command in the AST; every _gen_* writes through w"""
+        dispatch = self._dispatch
+        for command in self.commands:
+            handler = dispatch.get(type(command))
+            if handler:
+                handler(command, w)
+    
+    def _generate_stream(self, w):
+        """
+        Generate a loop over read_csv chunks: every command after the load runs on
+        each chunk and saves append to their file, so memory is bounded by the chunk
+        size rather than the input. Per-command progress prints are left out of the loop.
+        """
+        load = self.commands[0]
+        filename = self._clean_string(load.filename)
+        args = self._c_reader_args(filename) + [f"chunksize={STREAM_CHUNK_ROWS:_}"]
+        w(f"# Stream data from CSV in chunks of {STREAM_CHUNK_ROWS:,} rows\n")
+        w(f"rows = 0\n")
+        w(f"for i, {self.df_var} in enumerate(_chunks({', '.join(args)})):\n")
+        w(f"    rows += len({self.df_var})\n")
+        
+        body = io.StringIO()
+        saved = []
+        dispatch = self._dispatch
+        for command in self.commands[1:]:
+            if isinstance(command, SaveNode):
+                saved.append(self._clean_string(command.filename))
+                self._gen_stream_save(command, body.write)
+                continue
+            handler = dispatch.get(type(command))
+            if handler:
+                handler(command, body.write)
+        for line in body.getvalue().splitlines():
+            if not line.startswith('print('):
+                w(f"    {line}\n" if line else "\n")
+        
+        if self.skip_rows > 0:
+            w(f"print(f'Loaded {{rows}} rows (skipped first {self.skip_rows} header rows)', file=out)\n")
+        else:
+            w(f"print(f'Loaded {{rows}} rows', file=out)\n")
+        for out in saved:
+            w(f"print(f'Data saved to {out}', file=out)\n")
+        w("\n")
+    
+    def _gen_stream_save(self, node, w):
+        """Save one chunk: the first chunk creates the file with a header, later ones append"""
+        filename = self._clean_string(node.filename)
+        w(f"# Save results to CSV\n")
+        w(f"{self.df_var}.to_csv('{filename}', index=False, mode='w' if i == 0 else 'a', header=i == 0)\n")
+        w("\n")
+    
+    def _c_reader_args(self, filename):
+        """read_csv arguments for the pandas C engine"""
+        # CRITICAL FIX: Use skiprows parameter in read_csv
+        # The C engine supports on_bad_lines='skip' (pandas >= 1.3), and an integer
+        # skiprows is handled inside its tokenizer rather than through a per-row callback.
+        # low_memory=False parses each column in one pass instead of re-guessing dtypes per chunk.
+        args = [f"'{filename}'"]
+        if self.skip_rows > 0:
+            args.append(f"skiprows={self.skip_rows}")
+        args += ["on_bad_lines='skip'", "low_memory=False"]
+        if self.usecols:
+            # A callable (rather than a list) tolerates names missing from the header,
+            # leaving those errors to the command that uses the column
+            names = ', '.join(f"'{col}'" for col in self.usecols)
+            args.append(f"usecols=lambda c: c in {{{names}}}")
+        return args
     
-    def _gen_load(self, node):
+    def _gen_load(self, node, w):
         """Generate load statement with skiprows if needed"""
         filename = self._clean_string(node.filename)
-        self.code_lines.append(f"# Load data from CSV")
+        w(f"# Load data from CSV\n")
+        
+        if self.use_arrow:
+            # Arrow's multithreaded CSV reader with Arrow-backed columns. This engine
+            # counts skiprows *after* the header, so `skip N` becomes a header offset.
+            # Rows with too many fields are skipped, as the C engine does. Short rows
+            # raise: pyarrow can't pad them with NaN like the C engine, and 'skip'
+            # would silently drop them.
+            args = [f"'{filename}'", "engine='pyarrow'", "dtype_backend='pyarrow'"]
+            if self.skip_rows > 0:
+                args.append(f"header={self.skip_rows}")
+            args.append("on_bad_lines=lambda row: 'skip' if row.actual_columns > row.expected_columns else 'error'")
+            if self.usecols:
+                # pyarrow rejects callables and unknown names, so probe the header first
+                names = ', '.join(f"'{col}'" for col in self.usecols)
+                probe = f"'{filename}', skiprows={self.skip_rows}" if self.skip_rows > 0 else f"'{filename}'"
+                w(f"header = pd.read_csv({probe}, nrows=0).columns\n")
+                args.append(f"usecols=[c for c in header if c in {{{names}}}]")
+        else:
+            args = self._c_reader_args(filename)
+        # No layout pass is emitted after loading: both engines already hand back one
+        # contiguous array per column, and filter/select/sort preserve that
+        w(f"{self.df_var} = pd.read_csv({', '.join(args)})\n")
         
-        # CRITICAL FIX: Use skiprows parameter in read_csv
         if self.skip_rows > 0:
-            self.code_lines.append(
-                f"{self.df_var} = pd.read_csv('{filename}', "
-                f"skiprows={self.skip_rows}, on_bad_lines='skip', engine='python')"
-            )
-            self.code_lines.append(f"print(f'Loaded {{len({self.df_var})}} rows (skipped first {self.skip_rows} header rows)')")
+            w(f"print(f'Loaded {{len({self.df_var})}} rows (skipped first {self.skip_rows} header rows)', file=out)\n")
         else:
-            self.code_lines.append(
-                f"{self.df_var} = pd.read_csv('{filename}', on_bad_lines='skip', engine='python')"
-            )
-            self.code_lines.append(f"print(f'Loaded {{len({self.df_var})}} rows')")
-        self.code_lines.append("")
+            w(f"print(f'Loaded {{len({self.df_var})}} rows', file=out)\n")
+        w("\n")
     
-    def _gen_save(self, node):
+    def _gen_skip(self, node, w):
+        """Skip is handled in load command, just add a comment"""
+        w(f"# Skip handled in load (skiprows={self.skip_rows})\n")
+        w("\n")
+    
+    def _gen_save(self, node, w):
         """Generate save statement"""
         filename = self._clean_string(node.filename)
-        self.code_lines.append(f"# Save results to CSV")
-        self.code_lines.append(f"{self.df_var}.to_csv('{filename}', index=False)")
-        self.code_lines.append(f"print(f'Data saved to {filename}')")
-        self.code_lines.append("")
+        w(f"# Save results to CSV\n")
+        w(f"{self.df_var}.to_csv('{filename}', index=False)\n")
+        w(f"print(f'Data saved to {filename}', file=out)\n")
+        w("\n")
     
-    def _gen_filter(self, node):
-        """Generate filter statement"""
+    def _filter_parts(self, node):
+        """Column, Python operator and value literal of a filter condition"""
         column = self._clean_string(node.column)
-        operator = node.operator
         value = node.value
         
         # Handle comparison operators
         op_map = {'==': '==', '!=': '!=', '>': '>', '<': '<', '>=': '>=', '<=': '<='}
-        py_op = op_map.get(operator, '==')
+        py_op = op_map.get(node.operator, '==')
         
         # Clean up value (remove extra quotes if present)
         if isinstance(value, str) and (value.startswith('"') or value.startswith("'")):
             value = value.strip('"').strip("'")
             value = f"'{value}'"
-        
-        self.code_lines.append(f"# Filter: {column} {operator} {value}")
-        self.code_lines.append(f"{self.df_var} = {self.df_var}[{self.df_var}['{column}'] {py_op} {value}]")
-        self.code_lines.append(f"print(f'After filter: {{len({self.df_var})}} rows')")
-        self.code_lines.append("")
+        return column, py_op, value
+    
+    def _gen_filter(self, node, w):
+        """Generate filter statement"""
+        column, py_op, value = self._filter_parts(node)
+        w(f"# Filter: {column} {node.operator} {value}\n")
+        w(f"{self.df_var} = {self.df_var}[{self.df_var}['{column}'] {py_op} {value}]\n")
+        w(f"print(f'After filter: {{len({self.df_var})}} rows', file=out)\n")
+        w("\n")
+    
+    def _gen_filter_group(self, node, w):
+        """Generate one combined mask for consecutive filters, so the frame is indexed once"""
+        parts = [self._filter_parts(f) for f in node.filters]
+        w(f"# Filter: {' and '.join(f'{c} {op} {v}' for c, op, v in parts)}\n")
+        conditions = ' & '.join(f"({self.df_var}['{c}'] {op} {v})" for c, op, v in parts)
+        w(f"mask = {conditions}\n")
+        w(f"{self.df_var} = {self.df_var}[mask]\n")
+        w(f"print(f'After filter: {{len({self.df_var})}} rows', file=out)\n")
+        w("\n")
     
-    def _gen_select(self, node):
+    def _gen_select(self, node, w):
         """Generate select statement"""
         columns = [f"'{self._clean_string(col)}'" for col in node.columns]
-        self.code_lines.append(f"# Select columns")
-        self.code_lines.append(f"{self.df_var} = {self.df_var}[[{', '.join(columns)}]]")
-        self.code_lines.append(f"print(f'Selected {{len({self.df_var}.columns)}} columns')")
-        self.code_lines.append("")
+        w(f"# Select columns\n")
+        w(f"{self.df_var} = {self.df_var}[[{', '.join(columns)}]]\n")
+        w(f"print(f'Selected {{len({self.df_var}.columns)}} columns', file=out)\n")
+        w("\n")
     
-    def _gen_sort(self, node):
+    def _gen_sort(self, node, w):
         """Generate sort statement"""
         column = self._clean_string(node.column)
         ascending = node.order.lower() == 'asc'
-        self.code_lines.append(f"# Sort by {column} ({node.order})")
-        self.code_lines.append(f"{self.df_var} = {self.df_var}.sort_values(by='{column}', ascending={ascending})")
-        self.code_lines.append(f"{self.df_var} = {self.df_var}.reset_index(drop=True)")
-        self.code_lines.append(f"print(f'Sorted by {column}')")
-        self.code_lines.append("")
+        # quicksort is fastest; a sort that follows another one must be stable so ties
+        # keep the earlier sort's order
+        kind = 'stable' if self.sorted else 'quicksort'
+        self.sorted = True
+        w(f"# Sort by {column} ({node.order})\n")
+        w(f"{self.df_var} = {self.df_var}.sort_values(by='{column}', ascending={ascending}, "
+          f"ignore_index=True, kind='{kind}')\n")
+        w(f"print(f'Sorted by {column}', file=out)\n")
+        w("\n")
     
-    def _gen_group_by(self, node):
+    def _gen_group_by(self, node, w):
         """Generate group by statement"""
         by_col = self._clean_string(node.column)
         agg_col = self._clean_string(node.aggregate_col)
@@ -150,75 +620,131 @@ class CodeGenerator:
         func_map = {'sum': 'sum', 'avg': 'mean', 'count': 'count', 'max': 'max', 'min': 'min'}
         py_func = func_map.get(agg_func, 'sum')
         
-        self.code_lines.append(f"# Group by {by_col} and {agg_func} {agg_col}")
-        self.code_lines.append(f"{self.df_var} = {self.df_var}.groupby('{by_col}')['{agg_col}'].{py_func}().reset_index()")
-        self.code_lines.append(f"{self.df_var}.columns = ['{by_col}', '{agg_col}_{py_func}']")
-        self.code_lines.append(f"print(f'Grouped by {by_col}')")
-        self.code_lines.append("")
+        w(f"# Group by {by_col} and {agg_func} {agg_col}\n")
+        w(f"{self.df_var} = fast_groupby({self.df_var}, by='{by_col}', value='{agg_col}', func='{py_func}')\n")
+        w(f"{self.df_var}.columns = ['{by_col}', '{agg_col}_{py_func}']\n")
+        w(f"print(f'Grouped by {by_col}', file=out)\n")
+        w("\n")
     
-    def _gen_clean(self, node):
+    def _gen_clean(self, node, w):
         """Generate clean statement - with pandas 2.0+ syntax"""
         if node.clean_type == 'missing':
             if node.strategy == 'drop':
-                self.code_lines.append(f"# Drop rows with any missing values")
-                self.code_lines.append(f"{self.df_var} = {self.df_var}.dropna()")
+                w(f"# Drop rows with any missing values\n")
+                w(f"{self.df_var} = {self.df_var}.dropna()\n")
             elif node.strategy == 'ffill':
-                self.code_lines.append(f"# Forward fill missing values")
-                self.code_lines.append(f"{self.df_var} = {self.df_var}.ffill()")
+                w(f"# Forward fill missing values\n")
+                w(f"{self.df_var} = {self.df_var}.ffill()\n")
             elif node.strategy == 'bfill':
-                self.code_lines.append(f"# Backward fill missing values")
-                self.code_lines.append(f"{self.df_var} = {self.df_var}.bfill()")
-            self.code_lines.append(f"print(f'After cleaning: {{len({self.df_var})}} rows')")
+                w(f"# Backward fill missing values\n")
+                w(f"{self.df_var} = {self.df_var}.bfill()\n")
+            w(f"print(f'After cleaning: {{len({self.df_var})}} rows', file=out)\n")
         elif node.clean_type == 'duplicates':
-            self.code_lines.append(f"# Remove duplicate rows")
-            self.code_lines.append(f"{self.df_var} = {self.df_var}.drop_duplicates()")
-            self.code_lines.append(f"print(f'After removing duplicates: {{len({self.df_var})}} rows')")
+            w(f"# Remove duplicate rows\n")
+            w(f"{self.df_var} = {self.df_var}.drop_duplicates()\n")
+            w(f"print(f'After removing duplicates: {{len({self.df_var})}} rows', file=out)\n")
         elif node.clean_type == 'fillna':
             column = self._clean_string(node.column)
             value = node.value
-            self.code_lines.append(f"# Fill missing values in '{column}'")
-            self.code_lines.append(f"if '{column}' in {self.df_var}.columns:")
+            w(f"# Fill missing values in '{column}'\n")
+            w(f"if '{column}' in {self.df_var}.columns:\n")
             if value == 'np.nan':
-                self.code_lines.append(f"    {self.df_var}['{column}'] = np.nan")
+                w(f"    {self.df_var}['{column}'] = np.nan\n")
             else:
-                # Clean up the value (remove extra quotes)
-                value_clean = value.strip('"').strip("'")
-                # Check if it's a number
-                try:
-                    float(value_clean)
-                    fill_value = value_clean
-                except ValueError:
-                    fill_value = f"'{value_clean}'"
-                self.code_lines.append(f"    {self.df_var}['{column}'] = {self.df_var}['{column}'].fillna({fill_value})")
-            self.code_lines.append(f"else:")
-            self.code_lines.append(f"    print(f\"Warning: Column '{column}' not found in dataframe\")")
-        self.code_lines.append("")
-    
-    def _gen_trim(self, node):
+                fill_value = self._fill_literal(value)
+                w(f"    {self.df_var}['{column}'] = {self.df_var}['{column}'].fillna({fill_value})\n")
+            w(f"else:\n")
+            w(f"    print(f\"Warning: Column '{column}' not found in dataframe\", file=out)\n")
+        w("\n")
+    
+    def _gen_clean_block(self, node, w):
+        """Generate a single fused call for a run of cleaning commands"""
+        steps = ', '.join(self._describe_clean(c) for c in node.commands)
+        args = []
+        if node.trim:
+            args.append("trim=True")
+        if node.fillna:
+            fills = ', '.join(f"'{col}': {value}" for col, value in node.fillna.items())
+            args.append(f"fillna={{{fills}}}")
+        if node.fill:
+            args.append(f"fill='{node.fill}'")
+        if node.drop_na:
+            args.append("drop_na=True")
+        if node.dedupe:
+            args.append("dedupe=True")
+        if node.rename:
+            renames = ', '.join(f"'{old}': '{new}'" for old, new in node.rename.items())
+            args.append(f"rename={{{renames}}}")
+        args.append("out=out")
+        w(f"# Fused cleaning: {steps}\n")
+        w(f"{self.df_var} = _fused_clean({self.df_var}, {', '.join(args)})\n")
+        w(f"print(f'After cleaning: {{len({self.df_var})}} rows', file=out)\n")
+        w("\n")
+    
+    def _describe_clean(self, node):
+        """Short DTL-like description of a cleaning command for comments"""
+        if isinstance(node, TrimNode):
+            return "trim"
+        if isinstance(node, RenameNode):
+            return f"rename {self._clean_string(node.old_name)} to {self._clean_string(node.new_name)}"
+        if node.clean_type == 'fillna':
+            return f"fillna {self._clean_string(node.column)}"
+        if node.clean_type == 'duplicates':
+            return "clean duplicates"
+        return f"clean missing {node.strategy}"
+    
+    def _gen_trim(self, node, w):
         """Generate trim statement for string columns"""
-        self.code_lines.append(f"# Trim whitespace from all string columns")
-        self.code_lines.append(f"for col in {self.df_var}.select_dtypes(include=['object', 'string']).columns:")
-        self.code_lines.append(f"    if {self.df_var}[col].dtype == 'object':")
-        self.code_lines.append(f"        {self.df_var}[col] = {self.df_var}[col].astype(str).str.strip()")
-        self.code_lines.append(f"print('Trimmed whitespace from string columns')")
-        self.code_lines.append("")
-    
-    def _gen_rename(self, node):
+        w(f"# Trim whitespace from all string columns\n")
+        # .str.strip() works on object, str and Arrow string columns alike and keeps NaN,
+        # so no astype(str) copy is needed
+        w(f"str_cols = {self.df_var}.select_dtypes(include=['object', 'string']).columns\n")
+        w(f"{self.df_var} = {self.df_var}.assign(**{{col: {self.df_var}[col].str.strip() for col in str_cols}})\n")
+        w(f"print('Trimmed whitespace from string columns', file=out)\n")
+        w("\n")
+    
+    def _gen_rename(self, node, w):
         """Generate rename statement"""
         old_name = self._clean_string(node.old_name)
         new_name = self._clean_string(node.new_name)
-        self.code_lines.append(f"# Rename column '{old_name}' to '{new_name}'")
-        self.code_lines.append(f"if '{old_name}' in {self.df_var}.columns:")
-        self.code_lines.append(f"    {self.df_var} = {self.df_var}.rename(columns={{'{old_name}': '{new_name}'}})")
-        self.code_lines.append(f"else:")
-        self.code_lines.append(f"    print(f\"Warning: Column '{old_name}' not found\")")
-        self.code_lines.append("")
-    
-    def _clean_string(self, s):
+        w(f"# Rename column '{old_name}' to '{new_name}'\n")
+        w(f"if '{old_name}' in {self.df_var}.columns:\n")
+        w(f"    {self.df_var} = {self.df_var}.rename(columns={{'{old_name}': '{new_name}'}})\n")
+        w(f"else:\n")
+        w(f"    print(f\"Warning: Column '{old_name}' not found\", file=out)\n")
+        w("\n")
+    
+    def _gen_rename_group(self, node, w):
+        """Generate one rename call for several renames, re-projecting in the same statement"""
+        renames = ', '.join(f"'{old}': '{new}'" for old, new in node.mapping.items())
+        w(f"# Rename columns: {', '.join(f'{old} -> {new}' for old, new in node.mapping.items())}\n")
+        w(f"renames = {{{renames}}}\n")
+        w(f"for old in renames:\n")
+        w(f"    if old not in {self.df_var}.columns:\n")
+        w(f"        print(f\"Warning: Column '{{old}}' not found\", file=out)\n")
+        if node.select is None:
+            w(f"{self.df_var} = {self.df_var}.rename(columns=renames)\n")
+        else:
+            columns = ', '.join(f"'{self._clean_string(col)}'" for col in node.select)
+            w(f"{self.df_var} = {self.df_var}.rename(columns=renames)[[{columns}]]\n")
+            w(f"print(f'Selected {{len({self.df_var}.columns)}} columns', file=out)\n")
+        w("\n")
+    
+    def _fill_literal(self, value):
+        """Python literal for a fillna value: numbers stay bare, anything else is quoted"""
+        value_clean = self._clean_string(value)
+        try:
+            float(value_clean)
+            return value_clean
+        except ValueError:
+            return f"'{value_clean}'"
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _clean_string(s):
         """Remove quotes from string if present"""
-        if isinstance(s, str):
-            return s.strip('"').strip("'")
-        return str(s)
+        # Column names repeat throughout a program, so most calls are cache hits
+        return s.strip('"\'') if isinstance(s, str) else str(s)
 
 
 # Test the code generator
@@ -0,0 +1,207 @@
+"""
+DTL Runtime - helpers imported by generated programs.
+Group-by aggregation runs on Numba-compiled factorize+reduce kernels when
+Numba is installed, and falls back to plain pandas otherwise. Integer
+sum/min/max are reduced exactly in int64; everything else in float64.
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # Numba is optional; pandas handles everything without it
+    numba = None
+
+# Below this many rows the JIT compile and factorize overhead outweighs the win
+MIN_ROWS = 100_000
+# Rows at which the reduction is split across threads
+PARALLEL_ROWS = 1_000_000
+
+_SUM, _MEAN, _COUNT, _MIN, _MAX = range(5)
+_FUNCS = {'sum': _SUM, 'mean': _MEAN, 'count': _COUNT, 'min': _MIN, 'max': _MAX}
+_INT64_MIN, _INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _group_reduce(codes, values, n_groups, op, n_chunks):
+        """Reduce values per group code; each chunk of rows gets its own accumulators"""
+        n = codes.shape[0]
+        step = (n + n_chunks - 1) // n_chunks
+        init = np.inf if op == _MIN else (-np.inf if op == _MAX else 0.0)
+        acc = np.full((n_chunks, n_groups), init)
+        comp = np.zeros((n_chunks, n_groups))
+        nobs = np.zeros((n_chunks, n_groups), dtype=np.int64)
+
+        for chunk in numba.prange(n_chunks):
+            for i in range(chunk * step, min(n, (chunk + 1) * step)):
+                code = codes[i]
+                value = values[i]
+                if code < 0 or np.isnan(value):
+                    continue
+                nobs[chunk, code] += 1
+                if op == _MIN:
+                    if value < acc[chunk, code]:
+                        acc[chunk, code] = value
+                elif op == _MAX:
+                    if value > acc[chunk, code]:
+                        acc[chunk, code] = value
+                elif op != _COUNT:
+                    # Kahan summation, matching pandas' own groupby sum/mean
+                    y = value - comp[chunk, code]
+                    t = acc[chunk, code] + y
+                    comp[chunk, code] = t - acc[chunk, code] - y
+                    acc[chunk, code] = t
+
+        out = np.empty(n_groups)
+        for group in numba.prange(n_groups):
+            count = 0
+            for chunk in range(n_chunks):
+                count += nobs[chunk, group]
+            if op == _COUNT:
+                out[group] = count
+            elif op == _MIN or op == _MAX:
+                best = acc[0, group]
+                for chunk in range(1, n_chunks):
+                    other = acc[chunk, group]
+                    if (op == _MIN and other < best) or (op == _MAX and other > best):
+                        best = other
+                out[group] = best if count > 0 else np.nan
+            else:
+                total = 0.0
+                c = 0.0
+                for chunk in range(n_chunks):
+                    y = acc[chunk, group] - c
+                    t = total + y
+                    c = t - total - y
+                    total = t
+                if op == _MEAN:
+                    out[group] = total / count if count > 0 else np.nan
+                else:
+                    out[group] = total
+        return out
+
+    @numba.njit(parallel=True, cache=True)
+    def _group_reduce_int(codes, values, n_groups, op, init, n_chunks):
+        """Integer sum/min/max per group code, accumulated exactly in int64"""
+        n = codes.shape[0]
+        step = (n + n_chunks - 1) // n_chunks
+        acc = np.full((n_chunks, n_groups), init, dtype=np.int64)
+
+        for chunk in numba.prange(n_chunks):
+            for i in range(chunk * step, min(n, (chunk + 1) * step)):
+                code = codes[i]
+                if code < 0:
+                    continue
+                value = values[i]
+                if op == _MIN:
+                    if value < acc[chunk, code]:
+                        acc[chunk, code] = value
+                elif op == _MAX:
+                    if value > acc[chunk, code]:
+                        acc[chunk, code] = value
+                else:
+                    acc[chunk, code] += value
+
+        out = np.empty(n_groups, dtype=np.int64)
+        for group in numba.prange(n_groups):
+            best = acc[0, group]
+            for chunk in range(1, n_chunks):
+                other = acc[chunk, group]
+                if op == _MIN:
+                    if other < best:
+                        best = other
+                elif op == _MAX:
+                    if other > best:
+                        best = other
+                else:
+                    best += other
+            out[group] = best
+        return out
+
+
+
+def _is_plain_numeric(series):
+    """True for numeric (non-boolean) columns the kernels can reduce"""
+    dtype = series.dtype
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _pandas_groupby(df, by, value, func):
+    """The pandas expression fast_groupby stands in for"""
+    return getattr(df.groupby(by)[value], func)().reset_index()
+
+
+def _int64_values(column, func):
+    """
+    The column as an int64 array for the exact integer kernel, or None when the
+    kernel can't reproduce pandas: missing values, or a sum that could overflow int64
+    """
+    if column.hasnans:
+        return None
+    if column.dtype.kind == 'u' and column.max() > _INT64_MAX:
+        return None
+    values = column.to_numpy(dtype=np.int64)
+    if func == 'sum' and len(values):
+        bound = max(abs(int(values.min())), abs(int(values.max())))
+        if bound * len(values) > _INT64_MAX:
+            return None
+    return values
+
+
+def fast_groupby(df, by, value, func):
+    """
+    Equivalent of df.groupby(by)[value].<func>().reset_index().
+    Keys are factorized once (categorical columns reuse their codes) and the
+    values reduced by a compiled kernel; only observed groups are returned.
+    The result has the same columns and dtypes as the pandas expression.
+    """
+    column = df[value]
+    if numba is None or func not in _FUNCS or len(df) < MIN_ROWS or not _is_plain_numeric(column):
+        return _pandas_groupby(df, by, value, func)
+
+    # pandas on zero rows gives the exact output dtypes (Arrow-backed, categorical,
+    # narrow integers) to rebuild the kernel result with. A non-empty template means
+    # unobserved categories are kept (observed=False), which is left to pandas.
+    template = _pandas_groupby(df.iloc[:0], by, value, func)
+    if len(template):
+        return _pandas_groupby(df, by, value, func)
+
+    int_values = None
+    if pd.api.types.is_integer_dtype(column.dtype) and func in ('sum', 'min', 'max'):
+        int_values = _int64_values(column, func)
+        if int_values is None:
+            return _pandas_groupby(df, by, value, func)
+
+    keys = df[by]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        codes = keys.cat.codes.to_numpy(dtype=np.int64)
+        uniques = keys.cat.categories
+    else:
+        codes, uniques = pd.factorize(keys, sort=True)
+        codes = codes.astype(np.int64, copy=False)
+
+    n_chunks = numba.get_num_threads() if len(codes) >= PARALLEL_ROWS else 1
+    op = _FUNCS[func]
+    if int_values is not None:
+        init = _INT64_MAX if op == _MIN else (_INT64_MIN if op == _MAX else 0)
+        result = _group_reduce_int(codes, int_values, len(uniques), op, init, n_chunks)
+    else:
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        result = _group_reduce(codes, values, len(uniques), op, n_chunks)
+
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        observed = np.bincount(codes[codes >= 0], minlength=len(uniques)) > 0
+        uniques, result = uniques[observed], result[observed]
+
+    if int_values is not None and len(result):
+        # pandas sums narrow integers in int64 and keeps the source dtype only if every
+        # total fits; the rarer widening case is left to pandas itself
+        dtype = template[value].dtype
+        info = np.iinfo(getattr(dtype, 'numpy_dtype', dtype))
+        if result.min() < info.min or result.max() > info.max:
+            return _pandas_groupby(df, by, value, func)
+
+    out = pd.DataFrame({0: pd.Series(uniques), 1: pd.Series(result)})
+    out.columns = [by, value]
+    return out.astype(template.dtypes.to_dict())
@@ -1,10 +1,11 @@
 """
-Lexical Analyzer (Lexer/Tokenizer) using PLY
+Lexical Analyzer (Lexer/Tokenizer) using a compiled master regex
 Updated to handle NaN and messy data literals.
 """
 
-import ply.lex as lex
+import re
 from enum import Enum
+from sys import intern
 
 class TokenType(Enum):
     # Original Keywords
@@ -31,115 +32,104 @@ class TokenType(Enum):
     # Punctuation & Special
     COMMA = "COMMA"; EOF = "EOF"; NEWLINE = "NEWLINE"
 
+# Small integer per token type, so the parser can dispatch by list index
+for _id, _token_type in enumerate(TokenType):
+    _token_type.id = _id
+del _id, _token_type
+
 class Token:
+    # Fixed fields: no per-token __dict__, and faster attribute access in the parser
+    __slots__ = ('type', 'type_id', 'value', 'line_number')
+    
     def __init__(self, token_type, value, line_number):
         self.type = token_type
+        self.type_id = token_type.id  # Integer index for the parser's jump table
         self.value = value
         self.line_number = line_number
 
     def __repr__(self):
         return f"Token({self.type.name}, {repr(self.value)}, line={self.line_number})"
 
-# PLY Lexer implementation
-tokens = [
-    'STRING', 'NUMBER', 'IDENTIFIER',
-    'GT', 'LT', 'GTE', 'LTE', 'EQ', 'NEQ',
-    'COMMA', 'NEWLINE'
-]
-
 # Reserved words
-reserved = {
-    'load': 'LOAD', 'filter': 'FILTER', 'select': 'SELECT',
-    'sort': 'SORT', 'by': 'BY', 'save': 'SAVE',
-    'group': 'GROUP', 'asc': 'ASC', 'desc': 'DESC',
-    'sum': 'SUM', 'avg': 'AVG', 'count': 'COUNT',
-    'max': 'MAX', 'min': 'MIN', 'clean': 'CLEAN',
-    'fillna': 'FILLNA', 'skip': 'SKIP', 'trim': 'TRIM',
-    'rename': 'RENAME', 'missing': 'MISSING', 'duplicates': 'DUPLICATES',
-    'drop': 'DROP', 'ffill': 'FFILL', 'bfill': 'BFILL', 'to': 'TO'
+KEYWORDS = {
+    'load': TokenType.LOAD, 'filter': TokenType.FILTER, 'select': TokenType.SELECT,
+    'sort': TokenType.SORT, 'by': TokenType.BY, 'save': TokenType.SAVE,
+    'group': TokenType.GROUP, 'asc': TokenType.ASC, 'desc': TokenType.DESC,
+    'sum': TokenType.SUM, 'avg': TokenType.AVG, 'count': TokenType.COUNT,
+    'max': TokenType.MAX, 'min': TokenType.MIN, 'clean': TokenType.CLEAN,
+    'fillna': TokenType.FILLNA, 'skip': TokenType.SKIP, 'trim': TokenType.TRIM,
+    'rename': TokenType.RENAME, 'missing': TokenType.MISSING, 'duplicates': TokenType.DUPLICATES,
+    'drop': TokenType.DROP, 'ffill': TokenType.FFILL, 'bfill': TokenType.BFILL, 'to': TokenType.TO
 }
 
-tokens += list(reserved.values())
-
-# Token definitions
-t_GT = r'>'
-t_LT = r'<'
-t_GTE = r'>='
-t_LTE = r'<='
-t_EQ = r'=='
-t_NEQ = r'!='
-t_COMMA = r','
-
-def t_STRING(t):
-    r'"[^"]*"|\'[^"]*\''
-    t.value = t.value[1:-1]  # Remove quotes
-    return t
-
-def t_NUMBER(t):
-    r'-?\d+(\.\d+)?'
-    if t.value == '-':
-        t.type = 'IDENTIFIER'  # Handle lone minus as identifier
-    else:
-        try:
-            t.value = float(t.value)
-        except ValueError:
-            t.type = 'IDENTIFIER'
-    return t
-
-def t_IDENTIFIER(t):
-    r'[a-zA-Z_][a-zA-Z0-9_]*'
-    t.type = reserved.get(t.value.lower(), 'IDENTIFIER')
-    if t.value.lower() == 'nan':
-        t.type = 'NUMBER'
-        t.value = 'np.nan'
-    return t
-
-def t_NEWLINE(t):
-    r'\n+'
-    t.lexer.lineno += len(t.value)
-    return t
-
-# Ignored characters
-t_ignore = ' \t'
-
-def t_error(t):
-    print(f"Illegal character '{t.value[0]}' at line {t.lexer.lineno}")
-    t.lexer.skip(1)
-
-# Build the lexer
-lexer_obj = lex.lex()
+OPERATORS = {
+    '>=': TokenType.GTE, '<=': TokenType.LTE, '==': TokenType.EQ,
+    '!=': TokenType.NEQ, '>': TokenType.GT, '<': TokenType.LT, ',': TokenType.COMMA
+}
 
 class Lexer:
+    # One compiled pattern with a named group per token class; the regex engine
+    # does the character scanning in C and each token costs a single match.
+    # Leading whitespace is absorbed into every match, so each iteration of the
+    # tokenizer loop yields a token instead of alternating with whitespace runs.
+    # A quote only reaches QUOTE when STRING found no closing quote on the line.
+    _MASTER = re.compile(r'''
+        \s*(?:
+        (?P<STRING>"[^"]*"|'[^']*') |
+        (?P<QUOTE>["']) |
+        (?P<NUMBER>-?\d+(?:\.\d+)?) |
+        (?P<IDENT>[A-Za-z_]\w*) |
+        (?P<OP>>=|<=|==|!=|>|<) |
+        (?P<COMMA>,) |
+        (?P<ERROR>.)
+        )
+    ''', re.VERBOSE)
+
+    # Case-folded word -> (token type, canonical value), built once; 'nan' lexes as a number
+    _KW_TOKENS = {word: (token_type, word) for word, token_type in KEYWORDS.items()}
+    _KW_TOKENS['nan'] = (TokenType.NUMBER, 'np.nan')
+
     def __init__(self, source_code):
         self.source = source_code
         self.tokens = []
         self.current_line = 1
 
     def tokenize(self):
-        # Preprocess: remove comments and empty lines
-        lines = []
-        for line in self.source.split('\n'):
+        """Tokenize the source line by line, skipping comments and empty lines"""
+        self.tokens = []
+        for line_number, line in enumerate(self.source.split('\n'), 1):
             line = line.strip()
             if not line or line.startswith('#'):
                 continue
-            lines.append(line)
-        processed_source = '\n'.join(lines)
-        
-        lexer_obj.input(processed_source)
-        self.tokens = []
-        while True:
-            tok = lexer_obj.token()
-            if not tok:
-                break
-            # Skip NEWLINE tokens as the parser doesn't expect them
-            if tok.type == 'NEWLINE':
-                continue
-            # Convert PLY token to our Token class
-            token_type = TokenType[tok.type]
-            token = Token(token_type, tok.value, tok.lineno)
-            self.tokens.append(token)
+            self.current_line = line_number
+            self._tokenize_line(line)
         self.tokens.append(Token(TokenType.EOF, None, self.current_line))
         return self.tokens
+
+    def _tokenize_line(self, line):
+        """Convert a single source line into tokens"""
+        append = self.tokens.append
+        line_number = self.current_line
+        for match in self._MASTER.finditer(line):
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'IDENT':
+                keyword = self._KW_TOKENS.get(value.lower())
+                if keyword is None:
+                    # Column names repeat throughout a script; share one string object
+                    append(Token(TokenType.IDENTIFIER, intern(value), line_number))
+                else:
+                    append(Token(keyword[0], keyword[1], line_number))
+            elif kind == 'NUMBER':
+                append(Token(TokenType.NUMBER, float(value), line_number))
+            elif kind == 'STRING':
+                append(Token(TokenType.STRING, value[1:-1], line_number))
+            elif kind == 'QUOTE':
+                raise SyntaxError(f"Unterminated string starting at line {line_number}")
+            elif kind == 'ERROR':
+                print(f"Illegal character '{value}' at line {line_number}")
+            else:
+                append(Token(OPERATORS[value], value, line_number))
     
     def print_tokens(self):
         """Prints the list of tokens generated during tokenization"""
@@ -6,21 +6,62 @@ Updated to handle robust compilation for messy data.
 
 import sys
 import os
+import hashlib
+import json
+from functools import lru_cache
 from lexer import Lexer
 from parser import Parser
 from semantic import SemanticAnalyzer
 from codegen import CodeGenerator
+from ast_nodes import ast_to_data, ast_from_data
+
+
+# The modules whose code decides what AST a source parses to
+AST_SOURCES = ('lexer.py', 'parser.py', 'ast_nodes.py')
+
+
+@lru_cache(maxsize=1)
+def _compiler_digest():
+    """Hash of the lexer, parser and AST node sources: any edit to them invalidates .dtlc files"""
+    digest = hashlib.blake2b(digest_size=16)
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in AST_SOURCES:
+        with open(os.path.join(src_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Command-line switch -> (DTLCompiler argument, value it sets)
+FLAGS = {
+    '--no-file-check': ('validate_files', False),
+    '--validate-columns': ('validate_columns', True),
+    '--arrow': ('use_arrow', True),
+    '--no-arrow': ('use_arrow', False),
+    '--stream': ('stream', True),
+    '--auto-stream': ('stream', None),
+    '--no-cache': ('use_cache', False),
+    '--verbose': ('verbose', True),
+    '--show-code': ('show_code', True),
+}
 
 
 class DTLCompiler:
     """Main compiler class that orchestrates the 4-phase pipeline"""
     
-    def __init__(self, source_file, output_file=None, validate_files=True, validate_columns=False):
+    def __init__(self, source_file, output_file=None, validate_files=True, validate_columns=False,
+                 use_arrow=False, stream=False, verbose=None, show_code=None, use_cache=True):
         self.source_file = source_file
         self.output_file = output_file or "generated_output.py"
         self.validate_files = validate_files
         self.validate_columns = validate_columns
+        self.use_arrow = use_arrow  # Opt-in pyarrow loading, for well-formed CSVs only
+        self.stream = stream        # True = always stream, None = stream only large inputs
+        self.use_cache = use_cache  # Reuse the parsed AST from <source>.dtlc when unchanged
+        self.cache_file = os.path.splitext(source_file)[0] + '.dtlc'
+        # Output flags are resolved once; None falls back to the command line
+        self.verbose = '--verbose' in sys.argv if verbose is None else verbose
+        self.show_code = self.verbose or ('--show-code' in sys.argv if show_code is None else show_code)
         
+        self.source = None  # Raw bytes of the source file, read once
         self.tokens = None
         self.ast = None
         self.generated_code = None
@@ -32,15 +73,20 @@ class DTLCompiler:
         print("=" * 60)
         
         try:
-            # Phase 1: Lexical Analysis (Now supports NaN and specific data types)
-            print("\n[Phase 1] Lexical Analysis...")
-            self._run_lexer()
-            print(f"Tokenization complete: {len(self.tokens)} tokens generated")
-            
-            # Phase 2: Syntax Analysis (Builds AST for cleaning and manipulation)
-            print("\n[Phase 2] Syntax Analysis...")
-            self._run_parser()
-            print(f"Parsing complete: {len(self.ast.commands)} commands in AST")
+            if self._load_cached_ast():
+                print(f"\n[Phase 1-2] Source unchanged, using cached AST from {self.cache_file}")
+                print(f"Parsing complete: {len(self.ast.commands)} commands in AST")
+            else:
+                # Phase 1: Lexical Analysis (Now supports NaN and specific data types)
+                print("\n[Phase 1] Lexical Analysis...")
+                self._run_lexer()
+                print(f"Tokenization complete: {len(self.tokens)} tokens generated")
+                
+                # Phase 2: Syntax Analysis (Builds AST for cleaning and manipulation)
+                print("\n[Phase 2] Syntax Analysis...")
+                self._run_parser()
+                print(f"Parsing complete: {len(self.ast.commands)} commands in AST")
+                self._save_cached_ast()
             
             # Phase 3: Semantic Analysis (Validates column existence and logic)
             print("\n[Phase 3] Semantic Analysis...")
@@ -66,26 +112,69 @@ class DTLCompiler:
         except Exception as e:
             # Enhanced error reporting for debugging student projects
             print(f"\nCOMPILATION ERROR: {str(e)}")
-            if '--verbose' in sys.argv:
+            if self.verbose:
                 import traceback
                 traceback.print_exc()
             return False
     
+    def _read_source(self):
+        # One unbuffered binary read, shared by the cache key and the lexer
+        if self.source is None:
+            with open(self.source_file, 'rb', buffering=0) as f:
+                self.source = f.read()
+        return self.source
+    
+    def _cache_key(self):
+        """Identifies the source contents and the compiler version the cached AST was built from"""
+        return {
+            'source': hashlib.blake2b(self._read_source(), digest_size=16).hexdigest(),
+            'compiler': _compiler_digest(),
+        }
+    
+    def _load_cached_ast(self):
+        """
+        Load the AST stored by an earlier compile of the same source with the same compiler.
+        The cache is plain JSON, so a planted .dtlc can at worst supply a wrong AST, never
+        run code. Only lexing and parsing are skipped: semantic checks depend on the data
+        files and always run.
+        """
+        if not self.use_cache or self.verbose:
+            return False  # --verbose wants the token and AST dumps of a real parse
+        try:
+            with open(self.cache_file, 'rb') as f:
+                cached = json.loads(f.read())
+            if cached['key'] != self._cache_key():
+                return False
+            self.ast = ast_from_data(cached['ast'])
+        except Exception:
+            return False  # Missing, unreadable, malformed or from another compiler version
+        return True
+    
+    def _save_cached_ast(self):
+        if not self.use_cache:
+            return
+        try:
+            data = json.dumps({'key': self._cache_key(), 'ast': ast_to_data(self.ast)})
+            with open(self.cache_file, 'w') as f:
+                f.write(data)
+        except (OSError, TypeError):
+            pass  # A read-only source directory just means no cache
+    
     def _run_lexer(self):
-        with open(self.source_file, 'r') as f:
-            source_code = f.read()
+        # A single decode of the bytes read for the cache key, skipping the text I/O layer
+        source_code = self._read_source().decode('utf-8')
         
         lexer = Lexer(source_code)
         self.tokens = lexer.tokenize()
         
-        if '--verbose' in sys.argv:
+        if self.verbose:
             lexer.print_tokens()
     
     def _run_parser(self):
         parser = Parser(self.tokens)
         self.ast = parser.parse()
         
-        if '--verbose' in sys.argv:
+        if self.verbose:
             print("\n=== Abstract Syntax Tree ===")
             for i, command in enumerate(self.ast.commands, 1):
                 print(f"{i}. {command}")
@@ -103,10 +192,10 @@ class DTLCompiler:
     
     def _run_code_generation(self):
         # Generates code with on_bad_lines='skip' to prevent CParserErrors
-        codegen = CodeGenerator(self.ast)
+        codegen = CodeGenerator(self.ast, use_arrow=self.use_arrow, stream=self.stream)
         self.generated_code = codegen.save_to_file(self.output_file)
         
-        if '--verbose' in sys.argv or '--show-code' in sys.argv:
+        if self.show_code:
             print("\n=== GENERATED PYTHON CODE ===")
             print(self.generated_code)
 
@@ -120,7 +209,12 @@ def main():
         print("  --output <file>     Specify output file (default: generated_output.py)")
         print("  --no-file-check     Skip file existence validation")
         print("  --validate-columns  Enable column validation (requires actual CSV)")
+        print("  --arrow             Load with the pyarrow engine (well-formed CSVs only)")
+        print("  --stream            Process the input in chunks (row-wise pipelines only)")
+        print("  --auto-stream       Stream only when the input CSV is 1 GB or larger")
+        print("  --no-cache          Always re-parse instead of reusing the cached AST (.dtlc)")
         print("  --verbose           Show detailed compilation steps")
+        print("  --show-code         Print the generated Python code")
         sys.exit(1)
     
     input_file = sys.argv[1]
@@ -130,25 +224,27 @@ def main():
         sys.exit(1)
     
     # Defaults and user-overrides
-    output_file = "generated_output.py"
-    validate_files = True
-    validate_columns = False
-    
-    # Process Command Line Arguments
-    for i in range(len(sys.argv)):
-        if sys.argv[i] == '--output' and i + 1 < len(sys.argv):
-            output_file = sys.argv[i + 1]
-        elif sys.argv[i] == '--no-file-check':
-            validate_files = False
-        elif sys.argv[i] == '--validate-columns':
-            validate_columns = True
-    
-    compiler = DTLCompiler(
-        input_file, 
-        output_file,
-        validate_files=validate_files,
-        validate_columns=validate_columns
-    )
+    options = {
+        'output_file': "generated_output.py",
+        'validate_files': True,
+        'validate_columns': False,
+        'use_arrow': False,
+        'stream': False,
+        'verbose': False,
+        'show_code': False,
+        'use_cache': True,
+    }
+    
+    # Process Command Line Arguments in a single pass
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == '--output':
+            options['output_file'] = next(args, options['output_file'])
+        elif arg in FLAGS:
+            name, value = FLAGS[arg]
+            options[name] = value
+    
+    compiler = DTLCompiler(input_file, **options)
     
     success = compiler.compile()
     sys.exit(0 if success else 1)
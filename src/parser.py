@@ -6,10 +6,19 @@ Updated to handle robust data cleaning and NaN values.
 from lexer import TokenType, Token
 from ast_nodes import *
 
+# Token sets checked while parsing, built once at import time
+_FILTER_OPS = frozenset({TokenType.GT, TokenType.LT, TokenType.GTE, TokenType.LTE, TokenType.EQ, TokenType.NEQ})
+_AGG_FUNCS = frozenset({TokenType.SUM, TokenType.AVG, TokenType.COUNT, TokenType.MAX, TokenType.MIN})
+_MISSING_STRATEGIES = frozenset({TokenType.DROP, TokenType.FFILL, TokenType.BFILL})
+_FILL_VALUES = frozenset({TokenType.STRING, TokenType.IDENTIFIER})
+_SORT_ORDERS = frozenset({TokenType.ASC, TokenType.DESC})
+
 class Parser:
     """Recursive Descent Parser for DTL"""
     
     def __init__(self, tokens):
+        # The lexer always ends the stream with an EOF token; the helpers below rely on
+        # it as a sentinel instead of bounds-checking every step
         self.tokens = tokens
         self.current = 0
         self.program = Program()
@@ -17,10 +26,6 @@ class Parser:
     def parse(self):
         """Main parsing method - returns AST"""
         while not self._is_at_end():
-            # Stop if we hit EOF
-            if self._peek().type == TokenType.EOF:
-                break
-            
             command = self._parse_command()
             if command:
                 self.program.add_command(command)
@@ -31,72 +36,54 @@ class Parser:
         """Parse a single command based on the starting keyword"""
         token = self._peek()
         
-        # Mapping keywords to specific parsing methods
-        handlers = {
-            TokenType.LOAD: self._parse_load,
-            TokenType.SKIP: self._parse_skip,
-            TokenType.TRIM: self._parse_trim,
-            TokenType.CLEAN: self._parse_clean,
-            TokenType.FILLNA: self._parse_fillna,
-            TokenType.RENAME: self._parse_rename,
-            TokenType.FILTER: self._parse_filter,
-            TokenType.SELECT: self._parse_select,
-            TokenType.SORT: self._parse_sort,
-            TokenType.SAVE: self._parse_save,
-            TokenType.GROUP: self._parse_group
-        }
-        
-        handler = handlers.get(token.type)
+        handler = _COMMAND_PARSERS[token.type_id]
         if handler:
-            return handler()
+            return handler(self)
         else:
             raise SyntaxError(f"Unexpected token {token.type.name} at line {token.line_number}")
 
     def _parse_load(self):
-        self._consume(TokenType.LOAD, "Expected 'load'")
-        filename_token = self._consume(TokenType.STRING, "Expected filename string after 'load'")
+        self._expect(TokenType.LOAD, "Expected 'load'")
+        filename_token = self._expect(TokenType.STRING, "Expected filename string after 'load'")
         return LoadNode(filename_token.value)
 
     def _parse_skip(self):
-        self._consume(TokenType.SKIP, "Expected 'skip'")
-        num_token = self._consume(TokenType.NUMBER, "Expected number after 'skip'")
+        self._expect(TokenType.SKIP, "Expected 'skip'")
+        num_token = self._expect(TokenType.NUMBER, "Expected number after 'skip'")
         return SkipNode(int(num_token.value))
 
     def _parse_trim(self):
-        self._consume(TokenType.TRIM, "Expected 'trim'")
+        self._expect(TokenType.TRIM, "Expected 'trim'")
         return TrimNode()
 
     def _parse_clean(self):
         """Parse: clean missing [drop|ffill|bfill] OR clean duplicates"""
-        self._consume(TokenType.CLEAN, "Expected 'clean'")
+        self._expect(TokenType.CLEAN, "Expected 'clean'")
         
-        token = self._current_token()
-        if token.type == TokenType.MISSING:
-            self._advance()
-            strategy_token = self._current_token()
-            if strategy_token.type in [TokenType.DROP, TokenType.FFILL, TokenType.BFILL]:
+        if self._match(TokenType.MISSING):
+            strategy_token = self._peek()
+            if strategy_token.type in _MISSING_STRATEGIES:
                 strategy = strategy_token.value.lower()
                 self._advance()
                 return CleanNode('missing', strategy=strategy)
             else:
                 raise SyntaxError(f"Expected drop/ffill/bfill after 'clean missing' at line {strategy_token.line_number}")
         
-        elif token.type == TokenType.DUPLICATES:
-            self._advance()
+        elif self._match(TokenType.DUPLICATES):
             return CleanNode('duplicates', strategy='drop')
         
-        raise SyntaxError(f"Expected 'missing' or 'duplicates' after 'clean' at line {token.line_number}")
+        raise SyntaxError(f"Expected 'missing' or 'duplicates' after 'clean' at line {self._peek().line_number}")
 
     def _parse_fillna(self):
         """Parse: fillna column value (Updated for NaN/np.nan)"""
-        self._consume(TokenType.FILLNA, "Expected 'fillna'")
-        column = self._consume(TokenType.IDENTIFIER, "Expected column name").value
+        self._expect(TokenType.FILLNA, "Expected 'fillna'")
+        column = self._expect(TokenType.IDENTIFIER, "Expected column name").value
         
-        val_token = self._current_token()
+        val_token = self._peek()
         # Accept numbers, strings, or the special np.nan value
         if val_token.type == TokenType.NUMBER:
             value = val_token.value
-        elif val_token.type in [TokenType.STRING, TokenType.IDENTIFIER]:
+        elif val_token.type in _FILL_VALUES:
             value = f'"{val_token.value}"'
         else:
             raise SyntaxError(f"Expected value at line {val_token.line_number}")
@@ -105,32 +92,27 @@ class Parser:
         return CleanNode('fillna', column=column, value=value)
 
     def _parse_rename(self):
-        self._consume(TokenType.RENAME, "Expected 'rename'")
-        old_name = self._consume(TokenType.IDENTIFIER, "Expected old name").value
-        self._consume(TokenType.TO, "Expected 'to'")
-        new_name = self._consume(TokenType.IDENTIFIER, "Expected new name").value
+        self._expect(TokenType.RENAME, "Expected 'rename'")
+        old_name = self._expect(TokenType.IDENTIFIER, "Expected old name").value
+        self._expect(TokenType.TO, "Expected 'to'")
+        new_name = self._expect(TokenType.IDENTIFIER, "Expected new name").value
         return RenameNode(old_name, new_name)
 
     def _parse_filter(self):
         """Parse: filter column operator value (with strict syntax validation)"""
-        self._consume(TokenType.FILTER, "Expected 'filter'")
-        column = self._consume(TokenType.IDENTIFIER, "Expected column name").value
+        self._expect(TokenType.FILTER, "Expected 'filter'")
+        column = self._expect(TokenType.IDENTIFIER, "Expected column name").value
         
         # 1. Validate and capture the operator
-        op_token = self._current_token()
-        valid_operators = [
-            TokenType.GT, TokenType.LT, TokenType.GTE, 
-            TokenType.LTE, TokenType.EQ, TokenType.NEQ
-        ]
-        
-        if op_token.type not in valid_operators:
+        op_token = self._peek()
+        if op_token.type not in _FILTER_OPS:
             raise SyntaxError(f"Expected operator (>, <, ==, etc.) at line {op_token.line_number}")
         
         operator = op_token.value
         self._advance()
         
         # 2. Explicitly validate the VALUE token
-        val_token = self._current_token()
+        val_token = self._peek()
         
         if val_token.type == TokenType.NUMBER:
             value = val_token.value
@@ -145,78 +127,91 @@ class Parser:
         
         self._advance()
         return FilterNode(column, operator, value)
-        """Parse: filter column operator value (Updated for NaN support)"""
-        self._consume(TokenType.FILTER, "Expected 'filter'")
-        column = self._consume(TokenType.IDENTIFIER, "Expected column").value
-        
-        op_token = self._current_token()
-        if op_token.type not in [TokenType.GT, TokenType.LT, TokenType.GTE, TokenType.LTE, TokenType.EQ, TokenType.NEQ]:
-            raise SyntaxError(f"Expected operator at line {op_token.line_number}")
-        operator = op_token.value
-        self._advance()
-        
-        val_token = self._current_token()
-        if val_token.type == TokenType.NUMBER:
-            value = val_token.value
-        else:
-            value = f'"{val_token.value}"'
-        
-        self._advance()
-        return FilterNode(column, operator, value)
 
     def _parse_select(self):
-        self._consume(TokenType.SELECT, "Expected 'select'")
-        columns = [self._consume(TokenType.IDENTIFIER, "Expected column").value]
-        while self._peek().type == TokenType.COMMA:
-            self._consume(TokenType.COMMA, "Expected comma")
-            columns.append(self._consume(TokenType.IDENTIFIER, "Expected column").value)
+        self._expect(TokenType.SELECT, "Expected 'select'")
+        columns = [self._expect(TokenType.IDENTIFIER, "Expected column").value]
+        while self._match(TokenType.COMMA):
+            columns.append(self._expect(TokenType.IDENTIFIER, "Expected column").value)
         return SelectNode(columns)
 
     def _parse_sort(self):
-        self._consume(TokenType.SORT, "Expected 'sort'")
-        self._consume(TokenType.BY, "Expected 'by'")
-        column = self._consume(TokenType.IDENTIFIER, "Expected column").value
+        self._expect(TokenType.SORT, "Expected 'sort'")
+        self._expect(TokenType.BY, "Expected 'by'")
+        column = self._expect(TokenType.IDENTIFIER, "Expected column").value
         
         order = 'asc'
-        if not self._is_at_end() and self._peek().type in [TokenType.ASC, TokenType.DESC]:
+        if self._peek().type in _SORT_ORDERS:
             order = self._advance().value.lower()
         return SortNode(column, order)
 
     def _parse_save(self):
-        self._consume(TokenType.SAVE, "Expected 'save'")
-        filename = self._consume(TokenType.STRING, "Expected filename").value
+        self._expect(TokenType.SAVE, "Expected 'save'")
+        filename = self._expect(TokenType.STRING, "Expected filename").value
         return SaveNode(filename)
 
     def _parse_group(self):
-        self._consume(TokenType.GROUP, "Expected 'group'")
-        self._consume(TokenType.BY, "Expected 'by'")
-        column = self._consume(TokenType.IDENTIFIER, "Expected group column").value
+        self._expect(TokenType.GROUP, "Expected 'group'")
+        self._expect(TokenType.BY, "Expected 'by'")
+        column = self._expect(TokenType.IDENTIFIER, "Expected group column").value
         
-        agg_token = self._current_token()
-        if agg_token.type not in [TokenType.SUM, TokenType.AVG, TokenType.COUNT, TokenType.MAX, TokenType.MIN]:
+        agg_token = self._peek()
+        if agg_token.type not in _AGG_FUNCS:
             raise SyntaxError(f"Expected aggregate function at line {agg_token.line_number}")
         agg_func = self._advance().value.lower()
         
-        agg_col = self._consume(TokenType.IDENTIFIER, "Expected agg column").value
+        agg_col = self._expect(TokenType.IDENTIFIER, "Expected agg column").value
         return GroupByNode(column, agg_col, agg_func)
 
     # --- Utility Helpers ---
     def _peek(self):
         return self.tokens[self.current]
 
-    def _current_token(self):
-        return self.tokens[self.current]
-
     def _advance(self):
-        if not self._is_at_end():
+        token = self.tokens[self.current]
+        if token.type is not TokenType.EOF:
             self.current += 1
-        return self.tokens[self.current - 1]
+        return token
 
     def _is_at_end(self):
-        return self.current >= len(self.tokens)
+        return self.tokens[self.current].type is TokenType.EOF
 
-    def _consume(self, token_type, error_message):
-        if self._is_at_end() or self._current_token().type != token_type:
-            line = self._current_token().line_number if not self._is_at_end() else "EOF"
-            raise SyntaxError(f"{error_message} at line {line}")
-        return self._advance()
\ No newline at end of file
+    def _match(self, token_type):
+        """Consume and return the current token if it has the given type, else None"""
+        token = self.tokens[self.current]
+        if token.type is token_type:
+            self.current += 1
+            return token
+        return None
+
+    def _expect(self, token_type, error_message):
+        """Consume a required token; the error text is only formatted when it's missing"""
+        # Bind the position once; this runs for nearly every token
+        current = self.current
+        token = self.tokens[current]
+        if token.type is not token_type:
+            raise SyntaxError(f"{error_message} at line {token.line_number}")
+        self.current = current + 1
+        return token
+
+
+# Mapping keywords to specific parsing methods, built once at import time
+Parser._HANDLERS = {
+    TokenType.LOAD: Parser._parse_load,
+    TokenType.SKIP: Parser._parse_skip,
+    TokenType.TRIM: Parser._parse_trim,
+    TokenType.CLEAN: Parser._parse_clean,
+    TokenType.FILLNA: Parser._parse_fillna,
+    TokenType.RENAME: Parser._parse_rename,
+    TokenType.FILTER: Parser._parse_filter,
+    TokenType.SELECT: Parser._parse_select,
+    TokenType.SORT: Parser._parse_sort,
+    TokenType.SAVE: Parser._parse_save,
+    TokenType.GROUP: Parser._parse_group
+}
+
+# Jump table indexed by Token.type_id; None for tokens that can't start a command
+_COMMAND_PARSERS = [None] * len(TokenType)
+for _token_type, _handler in Parser._HANDLERS.items():
+    _COMMAND_PARSERS[_token_type.id] = _handler
+del _token_type, _handler
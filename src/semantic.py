@@ -9,9 +9,15 @@ FIXED: Respects skip commands when validating columns
 """
 
 import os
-import pandas as pd
+import sys
 from ast_nodes import *
 
+# Valid values for command arguments, built once at import time
+_VALID_OPS = frozenset({'>', '<', '>=', '<=', '==', '!='})
+_VALID_FUNCS = frozenset({'sum', 'avg', 'count', 'max', 'min'})
+_VALID_STRATS = frozenset({'drop', 'ffill', 'bfill'})
+_VALID_ORDERS = frozenset({'asc', 'desc'})
+
 
 class SemanticAnalyzer:
     """Validates semantic correctness of AST"""
@@ -29,6 +35,10 @@ class SemanticAnalyzer:
         self.has_load = False
         self.has_save = False
         self.selected_columns = None  # Track which columns are selected
+        self._last_select_idx = None  # Position of the most recent select, for filter warnings
+        self._last_select_cols = None
+        self._sorted_cols_cache = None  # "Available columns" text; reset whenever the columns change
+        self._exists = {}  # path -> os.path.exists result, so each path is stat'ed once
     
     def analyze(self):
         """Perform semantic analysis"""
@@ -36,9 +46,6 @@ class SemanticAnalyzer:
             self.errors.append("Empty program - no commands found")
             return False
         
-        # Pre-pass: detect filter-after-select issues
-        self._check_filter_select_ordering()
-        
         # Check command sequence
         for i, command in enumerate(self.ast.commands):
             self._analyze_command(command, i)
@@ -53,41 +60,11 @@ class SemanticAnalyzer:
         # Return True if no errors
         return len(self.errors) == 0
     
-    def _check_filter_select_ordering(self):
-        """Scan for filter commands that reference columns removed by select"""
-        last_select_idx = -1
-        selected_cols = set()
-        
-        for i, cmd in enumerate(self.ast.commands):
-            if isinstance(cmd, SelectNode):
-                last_select_idx = i
-                selected_cols = set(cmd.columns)
-            elif isinstance(cmd, FilterNode):
-                if last_select_idx >= 0 and cmd.column not in selected_cols:
-                    self.warnings.append(
-                        f"Command at position {i + 1}: Filter on '{cmd.column}' may fail because "
-                        f"'select' at position {last_select_idx + 1} doesn't include this column. "
-                        f"Consider filtering before selecting columns, or include '{cmd.column}' in select."
-                    )
-    
     def _analyze_command(self, command, index):
         """Map commands to specific analysis methods"""
-        method_map = {
-            LoadNode: self._analyze_load,
-            SkipNode: self._analyze_skip,
-            TrimNode: self._analyze_trim,
-            CleanNode: self._analyze_clean,
-            RenameNode: self._analyze_rename,
-            FilterNode: self._analyze_filter,
-            SelectNode: self._analyze_select,
-            SortNode: self._analyze_sort,
-            SaveNode: self._analyze_save,
-            GroupByNode: self._analyze_group
-        }
-        
-        handler = method_map.get(type(command))
+        handler = SemanticAnalyzer._HANDLERS.get(type(command))
         if handler:
-            handler(command, index)
+            handler(self, command, index)
 
     def _analyze_load(self, node, index):
         """Validate load command and read headers robustly - FIXED to respect skip"""
@@ -97,11 +74,13 @@ class SemanticAnalyzer:
         self.has_load = True
         self.current_file = node.filename
         
-        if self.validate_files and not os.path.exists(node.filename):
+        if self.validate_files and not self._path_exists(node.filename):
             self.errors.append(f"File not found: {node.filename}")
             return
         
         if self.validate_columns:
+            # pandas is only needed here, so compiling without column checks never imports it
+            import pandas as pd
             try:
                 # FIXED: Check for skip commands that come AFTER this load
                 skip_rows = 0
@@ -119,16 +98,25 @@ class SemanticAnalyzer:
                         # Stop looking if we hit a command that modifies structure
                         break
                 
-                # Read CSV with skiprows parameter
-                df = pd.read_csv(
-                    node.filename, 
-                    nrows=0, 
-                    skiprows=skip_rows if skip_rows > 0 else None,
-                    on_bad_lines='skip', 
-                    engine='python'
-                )
+                # Read CSV with skiprows parameter; the C engine reads the header
+                # directly, the Python engine is only a fallback for files it rejects
+                try:
+                    df = pd.read_csv(
+                        node.filename,
+                        nrows=0,
+                        skiprows=skip_rows if skip_rows > 0 else None
+                    )
+                except pd.errors.ParserError:
+                    df = pd.read_csv(
+                        node.filename, 
+                        nrows=0, 
+                        skiprows=skip_rows if skip_rows > 0 else None,
+                        on_bad_lines='skip', 
+                        engine='python'
+                    )
                 self.current_columns = set(df.columns)
                 self.selected_columns = None  # Reset selected columns
+                self._sorted_cols_cache = None
             except Exception as e:
                 self.errors.append(f"Cannot read headers from {node.filename}: {str(e)}")
 
@@ -148,7 +136,7 @@ class SemanticAnalyzer:
             self.errors.append(f"'clean' at position {index + 1} used before 'load'")
         
         if node.clean_type == 'missing':
-            if node.strategy not in ['drop', 'ffill', 'bfill']:
+            if node.strategy not in _VALID_STRATS:
                 self.errors.append(f"Invalid strategy '{node.strategy}' for clean missing")
         elif node.clean_type == 'duplicates':
             pass  # duplicates is always valid
@@ -167,10 +155,20 @@ class SemanticAnalyzer:
                 self.errors.append(f"Cannot rename '{node.old_name}' - column does not exist")
             else:
                 # Update current columns: remove old, add new
-                self.current_columns = set([node.new_name if c == node.old_name else c for c in self.current_columns])
+                self.current_columns.discard(node.old_name)
+                self.current_columns.add(node.new_name)
+                self._sorted_cols_cache = None
 
     def _analyze_filter(self, node, index):
         """Validate filter column, operator, and NaN values"""
+        # Detect filters that reference columns removed by an earlier select
+        if self._last_select_idx is not None and node.column not in self._last_select_cols:
+            self.warnings.append(
+                f"Command at position {index + 1}: Filter on '{node.column}' may fail because "
+                f"'select' at position {self._last_select_idx + 1} doesn't include this column. "
+                f"Consider filtering before selecting columns, or include '{node.column}' in select."
+            )
+        
         if not self.has_load:
             self.errors.append(f"'filter' at position {index + 1} used before 'load'")
             return
@@ -181,11 +179,10 @@ class SemanticAnalyzer:
             if node.column not in cols_to_check:
                 self.errors.append(
                     f"Column '{node.column}' not available at filter position {index + 1}. "
-                    f"Available columns: {', '.join(sorted(cols_to_check))}"
+                    f"Available columns: {self._sorted_columns(cols_to_check)}"
                 )
 
-        valid_operators = ['>', '<', '>=', '<=', '==', '!=']
-        if node.operator not in valid_operators:
+        if node.operator not in _VALID_OPS:
             self.errors.append(f"Invalid operator '{node.operator}'")
 
     def _analyze_select(self, node, index):
@@ -201,6 +198,9 @@ class SemanticAnalyzer:
         
         # Track selected columns for downstream validation
         self.selected_columns = set(node.columns)
+        self._last_select_idx = index
+        self._last_select_cols = self.selected_columns
+        self._sorted_cols_cache = None
 
     def _analyze_sort(self, node, index):
         """Validate sort command"""
@@ -213,11 +213,11 @@ class SemanticAnalyzer:
             if node.column not in cols_to_check:
                 self.errors.append(
                     f"Cannot sort by '{node.column}' - column not available at this point. "
-                    f"Available columns: {', '.join(sorted(cols_to_check))}"
+                    f"Available columns: {self._sorted_columns(cols_to_check)}"
                 )
         
         # Validate order
-        if node.order not in ['asc', 'desc']:
+        if node.order not in _VALID_ORDERS:
             self.errors.append(f"Invalid sort order '{node.order}' - must be 'asc' or 'desc'")
 
     def _analyze_save(self, node, index):
@@ -230,7 +230,7 @@ class SemanticAnalyzer:
         # Check if output directory exists
         if self.validate_files:
             output_dir = os.path.dirname(node.filename)
-            if output_dir and not os.path.exists(output_dir):
+            if output_dir and not self._path_exists(output_dir):
                 self.warnings.append(f"Output directory may not exist: {output_dir}")
 
     def _analyze_group(self, node, index):
@@ -247,30 +247,57 @@ class SemanticAnalyzer:
                 self.errors.append(f"Cannot aggregate '{node.aggregate_col}' - column not available")
         
         # Validate aggregate function
-        valid_funcs = ['sum', 'avg', 'count', 'max', 'min']
-        if node.aggregate_func not in valid_funcs:
+        if node.aggregate_func not in _VALID_FUNCS:
             self.errors.append(f"Invalid aggregate function '{node.aggregate_func}'")
     
+    def _sorted_columns(self, columns):
+        """Sorted, comma-separated column list for error messages, built once per column set"""
+        if self._sorted_cols_cache is None:
+            self._sorted_cols_cache = ', '.join(sorted(columns))
+        return self._sorted_cols_cache
+    
+    def _path_exists(self, path):
+        """os.path.exists, memoized for the duration of one analysis"""
+        exists = self._exists.get(path)
+        if exists is None:
+            exists = self._exists[path] = os.path.exists(path)
+        return exists
+    
     def print_report(self):
         """Print analysis report"""
-        print("\n=== SEMANTIC ANALYSIS REPORT ===")
+        # Build the whole report and write it once instead of one print per line
+        lines = ["\n=== SEMANTIC ANALYSIS REPORT ==="]
         
         if self.errors:
-            print(f"\nERRORS ({len(self.errors)}):")
-            for error in self.errors:
-                print(f"  • {error}")
+            lines.append(f"\nERRORS ({len(self.errors)}):")
+            lines.extend(f"  • {error}" for error in self.errors)
         
         if self.warnings:
-            print(f"\nWARNINGS ({len(self.warnings)}):")
-            for warning in self.warnings:
-                print(f"  • {warning}")
+            lines.append(f"\nWARNINGS ({len(self.warnings)}):")
+            lines.extend(f"  • {warning}" for warning in self.warnings)
         
         if not self.errors and not self.warnings:
-            print("\nNo errors or warnings - program is semantically correct!")
+            lines.append("\nNo errors or warnings - program is semantically correct!")
         
+        sys.stdout.write('\n'.join(lines) + '\n')
         return len(self.errors) == 0
 
 
+# Mapping node types to specific analysis methods, built once at import time
+SemanticAnalyzer._HANDLERS = {
+    LoadNode: SemanticAnalyzer._analyze_load,
+    SkipNode: SemanticAnalyzer._analyze_skip,
+    TrimNode: SemanticAnalyzer._analyze_trim,
+    CleanNode: SemanticAnalyzer._analyze_clean,
+    RenameNode: SemanticAnalyzer._analyze_rename,
+    FilterNode: SemanticAnalyzer._analyze_filter,
+    SelectNode: SemanticAnalyzer._analyze_select,
+    SortNode: SemanticAnalyzer._analyze_sort,
+    SaveNode: SemanticAnalyzer._analyze_save,
+    GroupByNode: SemanticAnalyzer._analyze_group
+}
+
+
 # Test semantic analyzer
 if __name__ == "__main__":
     from lexer import Lexer
@@ -0,0 +1,126 @@
+"""Generated loaders must keep the same rows whichever engine they use"""
+
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import Lexer
+from parser import Parser
+import codegen
+from codegen import CodeGenerator
+
+HAVE_ARROW = importlib.util.find_spec('pyarrow') is not None
+
+# A junk preamble line, one row with too many fields and one with too few
+MESSY = "EXPORT v1\nid,name,score\n1,a,10\n2,b,20,extra\n3,c\n4,d,40\n5,e,50\n"
+WELL_FORMED = "id,name,score\n1,a,10\n2,b,20\n3,c,\n4,d,40\n"
+
+
+class LoaderRowCountTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+    
+    def write_csv(self, text):
+        path = os.path.join(self.tmp, 'data.csv')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    
+    def run_program(self, source, **options):
+        code = CodeGenerator(Parser(Lexer(source).tokenize()).parse(), **options).generate()
+        namespace = {'__name__': 'dtl_generated'}
+        exec(compile(code, '<generated>', 'exec'), namespace)
+        return namespace['run'](out=io.StringIO())
+    
+    def program(self, path, skip=0):
+        out = os.path.join(self.tmp, 'out.csv')
+        skip_line = f"skip {skip}\n" if skip else ""
+        return f'load "{path}"\n{skip_line}save "{out}"\n'
+    
+    def test_c_engine_matches_python_engine(self):
+        path = self.write_csv(MESSY)
+        expected = pd.read_csv(path, skiprows=1, engine='python', on_bad_lines='skip')
+        df = self.run_program(self.program(path, skip=1), stream=False)
+        self.assertEqual(len(df), len(expected))
+        self.assertEqual(df['id'].tolist(), [1, 3, 4, 5])  # long row skipped, short row padded
+    
+    def test_stream_writes_every_row_and_returns_none(self):
+        path = self.write_csv(MESSY)
+        full = self.run_program(self.program(path, skip=1), stream=False)
+        self.assertIsNone(self.run_program(self.program(path, skip=1), stream=True))
+        streamed = pd.read_csv(os.path.join(self.tmp, 'out.csv'))
+        self.assertEqual(len(streamed), len(full))
+    
+    def test_stream_writes_header_for_input_without_rows(self):
+        path = self.write_csv("EXPORT v1\nid,name,score\n")
+        out = os.path.join(self.tmp, 'out.csv')
+        source = f'load "{path}"\nskip 1\nselect id, score\nsave "{out}"\n'
+        self.assertIsNone(self.run_program(source, stream=True))
+        with open(out) as f:
+            self.assertEqual(f.read(), "id,score\n")
+    
+    @unittest.skipUnless(HAVE_ARROW, "pyarrow is not installed")
+    def test_arrow_matches_c_engine_on_well_formed_input(self):
+        path = self.write_csv(WELL_FORMED)
+        c_rows = len(self.run_program(self.program(path), use_arrow=False, stream=False))
+        arrow_rows = len(self.run_program(self.program(path), use_arrow=True, stream=False))
+        self.assertEqual(arrow_rows, c_rows)
+    
+    @unittest.skipUnless(HAVE_ARROW, "pyarrow is not installed")
+    def test_arrow_skips_long_rows_like_c_engine(self):
+        path = self.write_csv(WELL_FORMED + "5,e,50,extra\n")
+        c_rows = len(self.run_program(self.program(path), use_arrow=False, stream=False))
+        arrow_rows = len(self.run_program(self.program(path), use_arrow=True, stream=False))
+        self.assertEqual(arrow_rows, c_rows)
+    
+    @unittest.skipUnless(HAVE_ARROW, "pyarrow is not installed")
+    def test_arrow_rejects_short_rows_instead_of_dropping_them(self):
+        path = self.write_csv(MESSY)
+        with self.assertRaises(pd.errors.ParserError):
+            self.run_program(self.program(path, skip=1), use_arrow=True, stream=False)
+
+
+class GeneratedScriptTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+    
+    def test_second_generate_emits_the_same_program(self):
+        source = 'load "data.csv"\nskip 1\nsort by a asc\nsort by b desc\nsave "out.csv"\n'
+        generator = CodeGenerator(Parser(Lexer(source).tokenize()).parse(), stream=False)
+        first = generator.generate()
+        codegen._CODE_CACHE.clear()  # As if the entry had been evicted
+        self.assertEqual(generator.generate(), first)
+        self.assertEqual(first.count("kind='stable'"), 1)
+    
+    def test_group_by_script_runs_without_the_compiler(self):
+        src = os.path.join(self.tmp, 'data.csv')
+        out = os.path.join(self.tmp, 'out.csv')
+        with open(src, 'w') as f:
+            f.write("dept,salary\na,10\nb,20\na,30\n")
+        source = f'load "{src}"\ngroup by dept avg salary\nsave "{out}"\n'
+        code = CodeGenerator(Parser(Lexer(source).tokenize()).parse(), stream=False).generate()
+        self.assertNotIn(os.path.dirname(os.path.abspath(sys.modules['codegen'].__file__)), code)
+        script = os.path.join(self.tmp, 'program.py')
+        with open(script, 'w') as f:
+            f.write(code)
+        # A fresh interpreter in another directory, with nothing from the repo on its path
+        env = {k: v for k, v in os.environ.items() if k != 'PYTHONPATH'}
+        subprocess.run([sys.executable, script], cwd=self.tmp, env=env, check=True, capture_output=True)
+        self.assertEqual(pd.read_csv(out).values.tolist(), [['a', 20.0], ['b', 20.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""fast_groupby must return exactly what the pandas expression it replaces returns"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dtl_runtime
+from dtl_runtime import fast_groupby
+
+ROWS = 300_000
+FUNCS = ('sum', 'mean', 'count', 'min', 'max')
+
+
+def pandas_groupby(df, by, value, func):
+    return getattr(df.groupby(by)[value], func)().reset_index()
+
+
+@unittest.skipIf(dtl_runtime.numba is None, "numba is not installed")
+class FastGroupByTest(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        keys = np.array(['north', 'south', 'east', 'west', 'central'])[rng.integers(0, 5, ROWS)]
+        floats = rng.normal(1000, 250, ROWS)
+        floats[rng.random(ROWS) < 0.05] = np.nan
+        cls.df = pd.DataFrame({
+            'key': keys,
+            'int64': rng.integers(-10**6, 10**6, ROWS),
+            'float64': floats,
+            'int32': rng.integers(-2**31, 2**31 - 1, ROWS, dtype=np.int32),
+            'big': rng.integers(2**53, 2**53 + 10**6, ROWS) // 1000,
+        })
+    
+    def assertSameAsPandas(self, df, by, value):
+        for func in FUNCS:
+            with self.subTest(value=value, dtype=str(df[value].dtype), func=func):
+                pd.testing.assert_frame_equal(
+                    fast_groupby(df, by, value, func), pandas_groupby(df, by, value, func))
+    
+    def test_numpy_columns(self):
+        for value in ('int64', 'float64', 'int32', 'big'):
+            self.assertSameAsPandas(self.df, 'key', value)
+    
+    def test_int64_sum_is_exact_above_2_53(self):
+        df = pd.DataFrame({'key': ['a', 'b'] * (ROWS // 2), 'value': np.full(ROWS, 2**53 + 1, dtype=np.int64)})
+        self.assertSameAsPandas(df, 'key', 'value')
+    
+    def test_sum_that_could_overflow_matches_pandas(self):
+        df = pd.DataFrame({'key': ['a'] * ROWS, 'value': np.full(ROWS, 2**62, dtype=np.int64)})
+        self.assertSameAsPandas(df, 'key', 'value')
+    
+    def test_categorical_keys(self):
+        df = self.df.assign(key=self.df['key'].astype('category'))
+        for value in ('int64', 'float64'):
+            self.assertSameAsPandas(df, 'key', value)
+    
+    def test_arrow_backed_columns(self):
+        df = self.df[['key', 'int64', 'float64']].convert_dtypes(dtype_backend='pyarrow')
+        for value in ('int64', 'float64'):
+            self.assertSameAsPandas(df, 'key', value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""The CLI's .dtlc AST cache must never run code and must notice compiler changes"""
+
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import main
+from main import DTLCompiler
+
+SOURCE = ('load "data.csv"\nskip 1\nclean missing drop\nfilter age > 30\n'
+          'select name, age\nrename age to years\nsort by years desc\nsave "out.csv"\n')
+
+
+class _Planted:
+    """Stands in for a malicious pickle payload"""
+    ran = False
+    
+    def __reduce__(self):
+        return (setattr, (_Planted, 'ran', True))
+
+
+class AstCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.source_file = os.path.join(self.tmp, 'prog.dtl')
+        with open(self.source_file, 'w') as f:
+            f.write(SOURCE)
+    
+    def compile(self):
+        compiler = DTLCompiler(self.source_file, output_file=os.path.join(self.tmp, 'out.py'),
+                               validate_files=False, verbose=False, show_code=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(compiler.compile())
+        return compiler
+    
+    def test_cached_ast_matches_a_fresh_parse(self):
+        fresh = self.compile()
+        cached = DTLCompiler(self.source_file, verbose=False, show_code=False)
+        self.assertTrue(cached._load_cached_ast())
+        self.assertEqual(cached.ast, fresh.ast)
+    
+    def test_pickled_cache_file_is_never_loaded(self):
+        with open(os.path.join(self.tmp, 'prog.dtlc'), 'wb') as f:
+            pickle.dump(_Planted(), f)
+        compiler = DTLCompiler(self.source_file, verbose=False, show_code=False)
+        self.assertFalse(compiler._load_cached_ast())
+        self.assertFalse(_Planted.ran)
+    
+    def test_compiler_change_invalidates_cache(self):
+        self.compile()
+        compiler = DTLCompiler(self.source_file, verbose=False, show_code=False)
+        with mock.patch.object(main, '_compiler_digest', return_value='another compiler'):
+            self.assertFalse(compiler._load_cached_ast())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,27 +3,201 @@ DTL Compiler - Flask Web Interface
 Complete rewrite with proper error handling and semantic validation
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
+import datetime
+import glob
+import hashlib
+import io
 import os
 import sys
 import re
-import subprocess
-import pandas as pd
+import threading
+import traceback
+import types
+from functools import lru_cache
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+# Paths are fixed for the life of the process, so resolve them once at import
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_DIR = os.path.join(REPO_ROOT, 'uploads')
+OUTPUT_DIR = os.path.join(REPO_ROOT, 'outputs')
+GENERATED_PY = os.path.join(OUTPUT_DIR, 'generated_output.py')
+OUTPUT_CSVS = os.path.join(OUTPUT_DIR, '*.csv')
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'src'))
 
 from lexer import Lexer
 from parser import Parser
 from semantic import SemanticAnalyzer
 from codegen import CodeGenerator
+from ast_nodes import LoadNode, SaveNode
+
+try:
+    from flask_compress import Compress
+except ImportError:  # Flask-Compress is optional; responses are sent uncompressed without it
+    Compress = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; Flask's stdlib json encoder is used without it
+    orjson = None
+
+# Load and save paths in submitted programs, rewritten in a single scan of the source
+_PATH_RE = re.compile(r'(load|save)\s+"([^"]+)"')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify through orjson, which encodes the row-dict previews several times faster"""
+    
+    def dumps(self, obj, **kwargs):
+        # Sorted keys match Flask's default output; anything orjson can't encode
+        # natively (Decimal, UUID, ...) goes through Flask's own default hook
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads'))
-app.config['OUTPUT_FOLDER'] = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'outputs'))
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+app.config['UPLOAD_FOLDER'] = UPLOAD_DIR
+app.config['OUTPUT_FOLDER'] = OUTPUT_DIR
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+# CSV text and the JSON previews shrink several-fold under gzip
+app.config['COMPRESS_MIMETYPES'] = ['text/csv', 'application/json', 'text/html']
+if Compress is not None:
+    Compress(app)
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+DEBUG = os.environ.get('DTL_DEBUG', '') not in ('', '0')  # Werkzeug debugger, compiler tracebacks
+RUN_TIMEOUT = 30  # seconds a generated program may run per request
+PREVIEW_BYTES = 64 * 1024  # uploads up to this size are previewed from memory
+
+# Generated programs run in this process; the shared script and the shared output
+# folder mean one compile at a time, from clearing the old CSVs to reading back the
+# new one
+_run_lock = threading.Lock()
+# Generated source -> executed module, so recompiling identical code skips re-exec
+_modules = {}
+_MODULES_SIZE = 32
+# Worker of the last run that outlived RUN_TIMEOUT; while it is alive it still writes
+# to the output folder, so new compiles are turned away
+_stray_run = None
+# Digest of the script last written to GENERATED_PY; read and set only under _run_lock
+_last_gen_digest = None
+
+
+@lru_cache(maxsize=64)
+def _parse_source(dtl_code):
+    """
+    Lex and parse a program (after path rewriting); resubmitting identical source
+    reuses the AST, and CodeGenerator's own cache then skips generation too
+    """
+    return Parser(Lexer(dtl_code).tokenize()).parse()
+
+
+def _file_stamp(path):
+    """(mtime, size) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@lru_cache(maxsize=128)
+def _analyze_source(dtl_code, file_stamps):
+    """
+    Semantic check of a program as (ok, errors, warnings). The analyzer reads loaded
+    files from disk, so the key includes their stamps: re-uploading a file misses.
+    """
+    analyzer = SemanticAnalyzer(_parse_source(dtl_code), validate_files=True, validate_columns=True)
+    ok = analyzer.analyze()
+    return ok, tuple(analyzer.errors), tuple(analyzer.warnings)
+
+
+def _preview_rows(df, n):
+    """
+    First n rows as JSON-safe dicts, converted while the rows are built instead of
+    replacing on a copy of the frame: missing values of any dtype become 'NaN', and
+    dates are shown as they are written to the CSV
+    """
+    import pandas as pd
+    na, nat = pd.NA, pd.NaT
+    
+    def cell(value):
+        if value is None or value is na or value is nat or (isinstance(value, float) and value != value):
+            return 'NaN'
+        if isinstance(value, (datetime.date, datetime.time)):
+            return str(value)
+        return value
+    
+    return [{col: cell(v) for col, v in row.items()} for row in df.head(n).to_dict('records')]
+
+
+@lru_cache(maxsize=32)
+def _upload_path(target_filename):
+    """Absolute, forward-slashed path of an uploaded file, as written into load commands"""
+    return os.path.abspath(os.path.join(UPLOAD_DIR, target_filename)).replace("\\", "/")
+
+
+def _write_generated(python_code, path):
+    """Write the generated program, skipping the write if the file already holds it; needs _run_lock"""
+    global _last_gen_digest
+    digest = hashlib.blake2b(python_code.encode(), digest_size=16).digest()
+    if digest != _last_gen_digest or not os.path.exists(path):
+        with open(path, 'w') as f:
+            f.write(python_code)
+        _last_gen_digest = digest
+
+
+def _load_generated(python_code, path):
+    """Execute the generated program as a module, reusing the module for identical code"""
+    module = _modules.get(python_code)
+    if module is None:
+        # Compiled from this request's source rather than imported from path, so the
+        # module is always the code that was generated; path only labels tracebacks
+        module = types.ModuleType('dtl_generated')
+        module.__file__ = path
+        exec(compile(python_code, path, 'exec'), module.__dict__)
+        if len(_modules) >= _MODULES_SIZE:
+            _modules.pop(next(iter(_modules)))
+        _modules[python_code] = module
+    return module
+
+
+def _run_generated(module):
+    """
+    Call the program's run() in a worker thread, collecting its output; the caller holds _run_lock.
+    Returns (DataFrame or None, stdout, error traceback or None); raises TimeoutError after RUN_TIMEOUT
+    seconds. A thread can't be killed, so a timed-out program finishes in the background and is
+    kept in _stray_run until it does.
+    """
+    global _stray_run
+    result = {}
+    
+    def target():
+        # run() prints to the stream it is given, so sys.stdout is never swapped: a
+        # timed-out program can't swallow the rest of the process's output
+        stdout = io.StringIO()
+        try:
+            result['df'] = module.run(out=stdout)
+        except Exception:
+            result['error'] = traceback.format_exc()
+        result['stdout'] = stdout.getvalue()
+    
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(RUN_TIMEOUT)
+    if worker.is_alive():
+        _stray_run = worker
+        raise TimeoutError
+    return result.get('df'), result['stdout'], result.get('error')
 
 
 @app.route('/')
@@ -44,15 +218,42 @@ def upload_file():
         return jsonify({'error': 'Invalid file type. Please upload a CSV.'}), 400
     
     filename = 'uploaded_data.csv'
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    filepath = os.path.join(UPLOAD_DIR, filename)
+    # FileStorage.save copies in 16KB pieces; 1MB keeps a full upload to a few syscalls.
+    # Lines are counted on the way through, so the true row count needs no second
+    # pass over the file, and a small upload is previewed from the bytes already read.
+    head = chunk = b''
+    lines = size = 0
+    with open(filepath, 'wb') as dst:
+        for chunk in iter(lambda: file.stream.read(1 << 20), b''):
+            if not head:
+                head = chunk[:PREVIEW_BYTES]
+            dst.write(chunk)
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+    if chunk and not chunk.endswith(b'\n'):
+        lines += 1  # Last line without a trailing newline
     
     try:
-        df = pd.read_csv(filepath, on_bad_lines='skip', engine='python', nrows=50)
+        # Imported on first use: pandas is most of the server's start-up time
+        import pandas as pd
+        
+        # A cut head can end inside the header or a quoted field, so only a head that is
+        # the whole upload is parsed from memory; otherwise nrows stops pandas after the
+        # first buffer of the written file
+        def read_preview(**kwargs):
+            source = io.BytesIO(head) if size == len(head) else filepath
+            return pd.read_csv(source, on_bad_lines='skip', nrows=50, **kwargs)
+        
+        try:
+            df = read_preview()
+        except pd.errors.ParserError:
+            # The C engine gives up on some malformed files the Python engine can skip through
+            df = read_preview(engine='python')
         preview = {
             'columns': df.columns.tolist(),
-            'rows': df.head(10).replace({float('nan'): 'NaN'}).to_dict('records'),
-            'total_rows': len(df)
+            'rows': _preview_rows(df, 10),
+            'total_rows': max(lines - 1, 0)  # Every line after the header, not just the previewed ones
         }
         return jsonify({'success': True, 'filename': filename, 'preview': preview})
     except Exception as e:
@@ -68,116 +269,141 @@ def compile_dtl():
     if not dtl_code:
         return jsonify({'error': 'No DTL code provided'}), 400
 
-    for f in os.listdir(app.config['OUTPUT_FOLDER']):
-        if f.endswith('.csv') or f == 'generated_output.py':
-            try:
-                os.remove(os.path.join(app.config['OUTPUT_FOLDER'], f))
-            except:
-                pass
+    if not _run_lock.acquire(timeout=RUN_TIMEOUT):
+        return jsonify({'error': 'Server busy: another program is still running, try again shortly'}), 503
+    if _stray_run is not None and _stray_run.is_alive():
+        # Answer now rather than after another RUN_TIMEOUT wait, and say why
+        _run_lock.release()
+        return jsonify({'error': f'A previous program timed out (>{RUN_TIMEOUT} seconds) and is still running; '
+                                 'try again once it finishes'}), 503
     
+    # The previous script stays until this compile either rewrites it or fails
+    written = False
     try:
-        if target_filename:
-            server_path = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], target_filename))
-            normalized_path = server_path.replace("\\", "/")
-            dtl_code = re.sub(r'load\s+"[^"]+"', f'load "{normalized_path}"', dtl_code)
-        
-        def _save_replace(m):
-            orig_name = os.path.basename(m.group(1))
-            full_out_path = os.path.abspath(os.path.join(app.config['OUTPUT_FOLDER'], orig_name))
-            return f'save "{full_out_path.replace("\\", "/")}"'
-        
-        dtl_code = re.sub(r'save\s+"([^"]+)"', _save_replace, dtl_code)
-
-        lexer = Lexer(dtl_code)
-        tokens = lexer.tokenize()
-        parser = Parser(tokens)
-        ast = parser.parse()
-        
-        analyzer = SemanticAnalyzer(ast, validate_files=True, validate_columns=True)
-        if not analyzer.analyze():
-            error_msg = f"Semantic validation failed ({len(analyzer.errors)} errors):\n"
-            error_msg += "\n".join([f"  • {e}" for e in analyzer.errors])
+        for path in glob.glob(OUTPUT_CSVS):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        
+        load_path = _upload_path(target_filename) if target_filename else None
+        
+        def _rewrite_path(m):
+            if m.group(1) == 'load':
+                # Without an upload, a relative path means the repo checkout, not
+                # whatever directory the server happened to be started from
+                path = load_path or os.path.join(REPO_ROOT, m.group(2)).replace("\\", "/")
+                return f'load "{path}"'
+            normalized_out = os.path.join(OUTPUT_DIR, os.path.basename(m.group(2))).replace("\\", "/")
+            return f'save "{normalized_out}"'
+        
+        dtl_code = _PATH_RE.sub(_rewrite_path, dtl_code)
+
+        ast = _parse_source(dtl_code)
+        
+        stamps = tuple(_file_stamp(c.filename) for c in ast.commands if isinstance(c, LoadNode))
+        ok, errors, warnings = _analyze_source(dtl_code, stamps)
+        if not ok:
+            error_msg = f"Semantic validation failed ({len(errors)} errors):\n"
+            error_msg += "\n".join([f"  • {e}" for e in errors])
             
-            if analyzer.warnings:
-                error_msg += f"\n\nWarnings ({len(analyzer.warnings)}):\n"
-                error_msg += "\n".join([f"  • {w}" for w in analyzer.warnings])
+            if warnings:
+                error_msg += f"\n\nWarnings ({len(warnings)}):\n"
+                error_msg += "\n".join([f"  • {w}" for w in warnings])
             
             return jsonify({'error': error_msg}), 400
         
-        codegen = CodeGenerator(ast)
+        # Uploads are far below the streaming threshold, and a streamed run() returns
+        # no DataFrame to preview, so always generate the in-memory pipeline
+        codegen = CodeGenerator(ast, stream=False)
         python_code = codegen.generate()
         
-        output_py = os.path.join(app.config['OUTPUT_FOLDER'], 'generated_output.py')
-        with open(output_py, 'w') as f:
-            f.write(python_code)
+        _write_generated(python_code, GENERATED_PY)
+        written = True
         
-        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        result = subprocess.run(
-            ['python', output_py], 
-            capture_output=True, 
-            text=True, 
-            cwd=repo_root,
-            timeout=30
-        )
+        # Run in-process: no interpreter start-up or second pandas import per request.
+        # Load and save paths were made absolute above, so the working directory
+        # doesn't matter.
+        out_df, execution_output, run_error = _run_generated(_load_generated(python_code, GENERATED_PY))
         
         output_data = None
-        csv_files = [f for f in os.listdir(app.config['OUTPUT_FOLDER']) if f.endswith('.csv')]
+        csv_paths = glob.glob(OUTPUT_CSVS)
         
-        if csv_files:
-            csv_file = csv_files[0]
+        if csv_paths:
+            out_path = csv_paths[0]
+            csv_file = os.path.basename(out_path)
             try:
-                out_path = os.path.join(app.config['OUTPUT_FOLDER'], csv_file)
-                out_df = pd.read_csv(out_path)
+                # When the program ends with this save, run() returned exactly what was
+                # written, so the preview doesn't need to parse the CSV back
+                last = ast.commands[-1]
+                if (out_df is None or not isinstance(last, SaveNode)
+                        or os.path.basename(last.filename) != csv_file):
+                    # The program wrote this file itself, so it is clean enough for
+                    # Arrow's multithreaded reader whenever the program used Arrow
+                    import pandas as pd
+                    engine = 'pyarrow' if codegen.use_arrow else 'c'
+                    out_df = pd.read_csv(out_path, engine=engine)
                 output_data = {
                     'columns': out_df.columns.tolist(),
-                    'rows': out_df.head(20).replace({float('nan'): 'NaN'}).to_dict('records'),
+                    'rows': _preview_rows(out_df, 20),
                     'total_rows': len(out_df),
                     'filename': csv_file
                 }
             except Exception as e:
                 return jsonify({'error': f'Error reading output CSV: {str(e)}'}), 500
         else:
-            if result.returncode != 0:
-                return jsonify({'error': f'Script execution failed:\n{result.stderr}'}), 500
+            if run_error:
+                return jsonify({'error': f'Script execution failed:\n{run_error}'}), 500
         
         response_data = {
             'success': True,
             'python_code': python_code,
-            'execution_output': result.stdout,
+            'execution_output': execution_output,
             'output_data': output_data
         }
         
-        if analyzer.warnings:
-            response_data['warnings'] = analyzer.warnings
+        if warnings:
+            response_data['warnings'] = list(warnings)
         
         return jsonify(response_data)
         
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Script execution timed out (>30 seconds)'}), 500
+    except TimeoutError:
+        return jsonify({'error': f'Script execution timed out (>{RUN_TIMEOUT} seconds); it keeps running '
+                                 'in the background and new compiles are refused until it finishes'}), 500
     except Exception as e:
-        import traceback
-        return jsonify({'error': f'Compiler Exception: {str(e)}\n{traceback.format_exc()}'}), 500
+        error = f'Compiler Exception: {str(e)}'
+        if DEBUG:
+            # Server-side stack frames and paths are only for whoever runs the server
+            error += f'\n{traceback.format_exc()}'
+        return jsonify({'error': error}), 500
+    finally:
+        if not written:
+            # A failed compile leaves no stale script behind for /download/python
+            try:
+                os.remove(GENERATED_PY)
+            except OSError:
+                pass
+        _run_lock.release()
 
 
 @app.route('/download/<file_type>')
 def download_file(file_type):
-    folder = app.config['OUTPUT_FOLDER']
-    
+    # conditional=True answers If-None-Match/If-Modified-Since with 304 and supports Range
     if file_type == 'python':
-        path = os.path.join(folder, 'generated_output.py')
-        if os.path.exists(path):
-            return send_file(path, as_attachment=True, download_name='generated_output.py')
+        if os.path.exists(GENERATED_PY):
+            return send_from_directory(OUTPUT_DIR, 'generated_output.py', as_attachment=True, conditional=True)
         return jsonify({'error': 'Python script not found'}), 404
         
     elif file_type == 'csv':
-        csv_files = [f for f in os.listdir(folder) if f.endswith('.csv')]
-        if csv_files:
-            csv_path = os.path.join(folder, csv_files[0])
-            return send_file(csv_path, as_attachment=True, download_name=csv_files[0])
+        csv_paths = glob.glob(OUTPUT_CSVS)
+        if csv_paths:
+            return send_from_directory(OUTPUT_DIR, os.path.basename(csv_paths[0]), as_attachment=True,
+                                       conditional=True, mimetype='text/csv')
         return jsonify({'error': 'No CSV output file found'}), 404
     
     return jsonify({'error': 'Invalid file type'}), 400
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Development server only; production runs wsgi:app under gunicorn or similar
+    app.run(debug=DEBUG, port=5000)
\ No newline at end of file
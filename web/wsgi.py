@@ -0,0 +1,8 @@
+"""
+DTL Compiler - WSGI entry point for production servers, e.g.
+    gunicorn --chdir web -k gthread --threads 4 -b 0.0.0.0:5000 wsgi:app
+"""
+
+from app import app
+
+__all__ = ['app']